@@ -0,0 +1,196 @@
+import hashlib
+import random
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+
+# ====== 接続プール設定 ======
+DEFAULT_POOL_SIZE = 10     # 1ホストあたりの keep-alive 接続数
+DEFAULT_RETRIES = 3        # 接続エラー・5xx の再試行回数
+BACKOFF_BASE_SEC = 1.0     # 再試行待ちの基準（指数的に増やしてジッターを掛ける）
+BACKOFF_MAX_SEC = 30.0
+RETRY_STATUSES = (500, 502, 504)  # 429/503 はレート制御側（RateLimitScheduler / sleep_for_reset）に任せる
+
+MAX_CLIENTS = 8            # 保持するクライアント（認証情報の組）の上限
+CLIENT_IDLE_SEC = 30 * 60  # これだけ使われなかったセッションは閉じて捨てる
+
+# ====== 計測（/metrics） ======
+HTTP_REQUESTS = metrics.counter(
+    "tweet_tools_http_requests_total", "APIリクエスト数（再試行も1回ずつ数える。status=error は接続エラー・タイムアウト）",
+    ("method", "endpoint", "status"))
+HTTP_RESPONSE_SECONDS = metrics.histogram(
+    "tweet_tools_http_response_seconds", "送信からレスポンスヘッダ受信までの時間", ("method", "endpoint"))
+HTTP_DNS_SECONDS = metrics.histogram("tweet_tools_http_dns_seconds", "新規接続時の名前解決の時間")
+HTTP_CONNECT_SECONDS = metrics.histogram("tweet_tools_http_connect_seconds", "新規接続時の TCP 接続の時間")
+HTTP_TLS_SECONDS = metrics.histogram("tweet_tools_http_tls_seconds", "新規接続時の TLS ハンドシェイクの時間")
+
+_ID_SEGMENT = re.compile(r"/\d{3,}(?=\.json$|/|$)")
+_USERNAME_SEGMENT = re.compile(r"(/users/by/username)/[^/]+")
+
+
+def endpoint_label(url: str) -> str:
+    """URL のパスからツイートID・ユーザーID・ユーザー名を伏せたもの（/1.1/statuses/destroy/:id.json など）"""
+    path = _ID_SEGMENT.sub("/:id", urlsplit(url).path)
+    return _USERNAME_SEGMENT.sub(r"\1/:username", path)
+
+
+def backoff_delay(attempt: int) -> float:
+    """attempt 回目（0始まり）の再試行までの待ち秒数（full jitter）"""
+    return random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** attempt)))
+
+
+class _TimedConnectionMixin:
+    """新規接続の名前解決と TCP 接続の時間を測る（keep-alive で使い回している間は呼ばれない）"""
+    _connect_sec = 0.0
+
+    def _new_conn(self):
+        host = self._dns_host
+        t0 = time.perf_counter()
+        try:
+            addrs = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)))
+        except OSError:
+            return super()._new_conn()  # 名前解決の失敗は urllib3 の例外に変換してもらう
+        t1 = time.perf_counter()
+        HTTP_DNS_SECONDS.observe(t1 - t0)
+        # 解決済みのアドレスへ順に接続する（urllib3 が同じ名前をもう一度引かないように）
+        try:
+            for i, addr in enumerate(addrs):
+                self._dns_host = addr
+                try:
+                    sock = super()._new_conn()
+                    break
+                except OSError:
+                    if i == len(addrs) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        self._connect_sec = time.perf_counter() - t0
+        HTTP_CONNECT_SECONDS.observe(time.perf_counter() - t1)
+        return sock
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        self._connect_sec = 0.0
+        t0 = time.perf_counter()
+        super().connect()
+        # connect() の所要時間から名前解決・TCP 接続（_new_conn）の分を引いた残りが TLS
+        HTTP_TLS_SECONDS.observe(max(0.0, time.perf_counter() - t0 - self._connect_sec))
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """接続を作るときの名前解決・TCP・TLS の時間を /metrics に記録する HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+class ApiClient:
+    """
+    認証情報1組ぶんの keep-alive セッション。
+    TCP/TLS 接続を使い回すので、長時間の削除でも1リクエスト＝1往復で済む。
+    """
+
+    def __init__(self, auth: Any = None, headers: Optional[Dict[str, str]] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES):
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if auth is not None:
+            self.session.auth = auth
+        if headers:
+            self.session.headers.update(headers)
+        self.last_used = time.time()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """接続エラー・タイムアウト・5xx はジッター付き指数バックオフで再試行する"""
+        self.last_used = time.time()
+        endpoint = endpoint_label(url)
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status="error")
+                if attempt >= self.retries:
+                    raise
+            else:
+                HTTP_REQUESTS.inc(method=method, endpoint=endpoint, status=str(resp.status_code))
+                HTTP_RESPONSE_SECONDS.observe(resp.elapsed.total_seconds(), method=method, endpoint=endpoint)
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return resp
+                resp.close()
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+# ====== 認証情報ごとのクライアント管理 ======
+_clients: "OrderedDict[str, ApiClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def credential_key(key_parts: Tuple[str, ...]) -> str:
+    # キーそのものを辞書のキーにしないようにハッシュ化しておく
+    return hashlib.sha256("\0".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def get_client(key_parts: Tuple[str, ...], auth: Any = None, headers: Optional[Dict[str, str]] = None,
+               pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES) -> ApiClient:
+    """
+    認証情報の組（key_parts）と再試行回数ごとに1つの ApiClient を使い回す。
+    古いもの・しばらく使われていないものは閉じて捨てる。
+    """
+    key = credential_key(key_parts + (f"retries={retries}",))
+    now = time.time()
+    stale = []
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+        else:
+            client = ApiClient(auth=auth, headers=headers, pool_size=pool_size, retries=retries)
+            _clients[key] = client
+        for k in list(_clients):
+            if k == key:
+                continue
+            if len(_clients) > MAX_CLIENTS or now - _clients[k].last_used > CLIENT_IDLE_SEC:
+                stale.append(_clients.pop(k))
+    for c in stale:
+        c.close()
+    return client
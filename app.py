@@ -1,48 +1,35 @@
-import io
-import os
 import json
+import os
+import re
 import time
 import threading
-from datetime import datetime, timezone, timedelta
-from typing import List, Tuple, Dict, Any, Optional
+import uuid
+from collections import OrderedDict
+from typing import Tuple, Dict, Any, Optional
+from urllib.parse import urlsplit
 
-from flask import Flask, request, render_template_string, redirect, url_for, jsonify, send_from_directory
-import requests
-from requests_oauthlib import OAuth1
+from flask import Flask, Response, request, render_template_string, redirect, url_for, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
-import email.utils as eut  # for RFC 2822 'created_at' parsing
+
+import metrics
+from settings import DATA_DIR, DEFAULT_WORKERS, INTERVAL_SEC, LOG_DIR, MAX_WORKERS
+from tweet_index import TweetIndex, parse_filters
+from worker_client import WorkerClient, WorkerUnavailable
 
 # ====== 基本設定 ======
 app = Flask(__name__)
-app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB
-LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# レート関連（1件ずつ方式）
-INTERVAL_SEC = 20  # 1件ごと20秒
-
-# タイムゾーン（JST固定）
-JST = timezone(timedelta(hours=9))
-
-# ====== 状態と制御フラグ ======
-pause_event = threading.Event()   # set中はポーズ状態
-cancel_event = threading.Event()  # setでキャンセル
-state_lock = threading.Lock()
-
-run_state: Dict[str, Any] = {
-    "running": False,
-    "total": 0,
-    "done": 0,
-    "ok": 0,
-    "ng": 0,
-    "current_id": None,
-    "current_text": "",
-    "phase": "idle",  # idle / processing / waiting / paused / canceled / finished / error
-    "wait_until": 0.0,  # 待機終了予定時刻（epoch秒）
-    "started_at": None,
-    "log_filename": None,
-    "message": "",
-}
+app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024 * 1024  # 1GB（アップロードは一時ファイルに退避され、解析はストリームで行う）
+SSE_KEEPALIVE_SEC = 5.0  # 変化が無くてもこの間隔で ETA を送り直す（接続維持も兼ねる）
+
+# 削除ジョブは別プロセス（worker.py）で動かし、ここからは IPC で頼むだけ（画面を WSGI で複数プロセスにしてもジョブは1つ）
+worker = WorkerClient()
+
+# 絞り込みプレビュー用に、解析済みの索引をしばらく覚えておく（再アップロードなしで条件を変えて数え直せる）
+# WSGI で複数プロセスにしても次のリクエストが別のプロセスに届いて使えるよう、ディスクにも書いておく
+INDEX_CACHE_SIZE = 4
+INDEX_CACHE_TTL_SEC = 30 * 60
+INDEX_CACHE_DIR = os.path.join(DATA_DIR, "preview_index")
+os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
 
 # ====== HTML（シングルファイルUI） ======
 HTML = """
@@ -58,7 +45,7 @@ HTML = """
     h1 { font-size: 20px; margin-bottom: 12px; }
     form { display: grid; gap: 12px; max-width: 900px; }
     label { font-weight: 600; }
-    input[type=text], input[type=password] { width: 100%; padding: 10px; border: 1px solid #ccc; border-radius: 8px; }
+    input[type=text], input[type=password], input[type=number] { width: 100%; padding: 10px; border: 1px solid #ccc; border-radius: 8px; }
     input[type=file] { padding: 6px 0; }
     .row { display: grid; grid-template-columns: 1fr 1fr; gap: 12px; }
     .btns { display: flex; flex-wrap: wrap; gap: 8px; }
@@ -113,12 +100,70 @@ HTML = """
       </div>
     </div>
 
-    <label>tweet.js（Twitterアーカイブ内のファイル）</label>
-    <input type="file" name="tweet_js" accept=".js,application/json">
+    <label>tweet.js（Twitterアーカイブ内のファイル）またはアーカイブZIP</label>
+    <input type="file" name="tweet_js" multiple accept=".js,.zip,application/json,application/zip">
+    <div class="muted">tweets-part1.js などの分割ファイルは複数選択できるよ。ZIPならそのまま中の tweets*.js を全部読むよ。</div>
+
+    <input type="hidden" name="index_token" value="{{ index_token or '' }}">
+    {% if index_token %}<div class="muted">解析済みの tweet.js を使うよ（選び直したときだけ再解析）。</div>{% endif %}
+
+    <label>削除するツイートの絞り込み（空欄なら全部）</label>
+    <div class="row filters">
+      <div>
+        <label>この日以降</label>
+        <input type="date" name="since_date" value="{{ ff.since_date or '' }}">
+      </div>
+      <div>
+        <label>この日より前</label>
+        <input type="date" name="until_date" value="{{ ff.until_date or '' }}">
+      </div>
+    </div>
+    <div class="row filters">
+      <div>
+        <label>リツイート</label>
+        <select name="retweets">
+          <option value="include" {% if (ff.retweets or 'include') == 'include' %}selected{% endif %}>含める</option>
+          <option value="exclude" {% if ff.retweets == 'exclude' %}selected{% endif %}>除く</option>
+          <option value="only" {% if ff.retweets == 'only' %}selected{% endif %}>リツイートだけ</option>
+        </select>
+      </div>
+      <div>
+        <label>リプライ</label>
+        <select name="replies">
+          <option value="include" {% if (ff.replies or 'include') == 'include' %}selected{% endif %}>含める</option>
+          <option value="exclude" {% if ff.replies == 'exclude' %}selected{% endif %}>除く</option>
+          <option value="only" {% if ff.replies == 'only' %}selected{% endif %}>リプライだけ</option>
+        </select>
+      </div>
+    </div>
+    <div class="row filters">
+      <div>
+        <label>いいね数がこれ以下</label>
+        <input type="number" name="max_likes" min="0" step="1" value="{{ ff.max_likes or '' }}">
+      </div>
+      <div>
+        <label>RT数がこれ以下</label>
+        <input type="number" name="max_rts" min="0" step="1" value="{{ ff.max_rts or '' }}">
+      </div>
+    </div>
+    <div class="filters">
+      <label>本文が正規表現にマッチ</label>
+      <input type="text" name="pattern" placeholder="例: (?i)ねむい|おなかすいた" value="{{ ff.pattern or '' }}">
+    </div>
+    <div class="status-line">対象: <b id="preview-count">{{ preview_count if preview_count is not none else '-' }}</b> 件{% if index_total is not none %} / 全 {{ index_total }} 件{% endif %}</div>
+
+    <label>同時実行数（ワーカー数）</label>
+    <input type="number" name="workers" min="1" max="{{ max_workers }}" step="1" value="{{ workers or default_workers }}">
+    <div class="muted">送信タイミングはレート枠に合わせて共有スケジューラが決めるので、増やしても制限は超えないよ。</div>
+
+    <label><input type="checkbox" name="preflight" value="1" {% if preflight %}checked{% endif %}> 削除の前に存在確認する</label>
+    <div class="muted">100件ずつまとめて確認して、もう消えているツイートには削除リクエストを送らないよ（前に途中まで消した tweet.js 向け）。</div>
 
     <div class="btns">
       <button class="check" type="submit" name="action" value="check">接続確認</button>
+      <button class="check" type="submit" name="action" value="preview">対象件数を確認（削除しない）</button>
       <button class="run" type="submit" name="action" value="run">実行（削除）</button>
+      <button class="run" type="submit" name="action" value="resume">中断したジョブを再開</button>
     </div>
   </form>
 
@@ -130,8 +175,9 @@ HTML = """
     </div>
 
     <div id="status-view">
+      <div class="status-line mono">ジョブ: <span id="st-job">-</span></div>
       <div class="status-line">状態: <b id="st-phase">idle</b> / 実行中: <b id="st-running">false</b></div>
-      <div class="status-line">進捗: <span id="st-done">0</span> / <span id="st-total">0</span>（OK: <span id="st-ok">0</span> / NG: <span id="st-ng">0</span>）</div>
+      <div class="status-line">進捗: <span id="st-done">0</span> / <span id="st-total">0</span>（OK: <span id="st-ok">0</span> / NG: <span id="st-ng">0</span> / スキップ: <span id="st-skipped">0</span> / 再送待ち: <span id="st-retrying">0</span>）/ 応答待ち: <span id="st-inflight">0</span></div>
       <div class="progress-wrap">
         <progress id="st-progress" value="0" max="100"></progress>
       </div>
@@ -140,10 +186,31 @@ HTML = """
       <div class="status-line mono">現在: ID <span id="st-id">-</span> / <span id="st-text">-</span></div>
       <div class="status-line">待機: <span class="countdown" id="st-wait">-</span></div>
       <div class="status-line">ログ: <span id="st-log">-</span> <span id="st-loglink" class="log-link"></span></div>
-      <div class="status-line muted">注: 1件ごとに {{ interval_sec }} 秒待機するよ。tweet.js は <span class="kbd">window.YTD.tweets.part0 = [...];</span> を想定。</div>
+      <div class="status-line muted">注: レート制限ヘッダの残り枠に合わせて送信間隔を自動調整するよ（ヘッダが無いときは1件ごとに {{ interval_sec }} 秒）。tweet.js は <span class="kbd">window.YTD.tweets.partN = [...]</span> を想定（アーカイブZIPも可）。</div>
     </div>
   </div>
 
+  <div class="panel">
+    <b>ログ検索</b>（過去の全ログから、そのツイートをいつ・どの結果で処理したかを探すよ）
+    <div class="flex">
+      <input type="text" id="log-search-id" placeholder="ツイートID か URL">
+      <button class="ctrl" id="btn-log-search">検索</button>
+      <a href="{{ url_for('summarize_logs') }}" target="_blank">集計（状態別・月別）</a>
+    </div>
+    <pre class="mono" id="log-search-result"></pre>
+  </div>
+
+  {% if jobs %}
+  <div class="panel">
+    <b>ジョブ一覧</b>（アカウントごとに並行して実行できるよ）
+    <ul>
+    {% for j in jobs %}
+      <li class="mono"><a href="{{ url_for('index', job=j.job_id) }}">{{ j.job_id[:8] }}</a> {{ j.phase }} {{ j.done }}/{{ j.total }}{% if j.job_id == job_id %} ← 表示中{% endif %}</li>
+    {% endfor %}
+    </ul>
+  </div>
+  {% endif %}
+
 <script>
 const $ = (sel) => document.querySelector(sel);
 
@@ -155,7 +222,7 @@ function fmtText(s, n=80) {
 
 async function postControl(cmd) {
   try {
-    const res = await fetch("{{ url_for('control') }}", {
+    const res = await fetch("{{ url_for('control', job_id=job_id) }}", {
       method: "POST",
       headers: {"Content-Type":"application/x-www-form-urlencoded"},
       body: "cmd=" + encodeURIComponent(cmd)
@@ -168,240 +235,213 @@ $("#btn-pause").addEventListener("click", () => postControl("pause"));
 $("#btn-resume").addEventListener("click", () => postControl("resume"));
 $("#btn-cancel").addEventListener("click", () => postControl("cancel"));
 
+// ---- 進捗表示（/events の差分を S に積み上げて描画。使えなければ /status をポーリング） ----
+const S = {};
+let waitDeadline = 0;  // 待機終了予定（ブラウザ時計）
+
+function renderWait() {
+  if (S.phase === "waiting" && S.wait_remaining >= 0) {
+    $("#st-wait").textContent = Math.max(0, Math.ceil((waitDeadline - Date.now()) / 1000)) + " 秒";
+  } else if (S.phase === "paused") {
+    $("#st-wait").textContent = "一時停止中";
+  } else {
+    $("#st-wait").textContent = "-";
+  }
+}
+
+function render(s) {
+  $("#st-job").textContent = s.job_id || "-";
+  $("#st-phase").textContent = s.phase;
+  $("#st-running").textContent = s.running;
+  $("#st-done").textContent = s.done;
+  $("#st-total").textContent = s.total;
+  $("#st-ok").textContent = s.ok;
+  $("#st-ng").textContent = s.ng;
+  $("#st-skipped").textContent = s.skipped ?? 0;
+  $("#st-retrying").textContent = s.retrying ?? 0;
+  $("#st-inflight").textContent = s.inflight ?? 0;
+  $("#st-id").textContent = s.current_id || "-";
+  $("#st-text").textContent = fmtText(s.current_text || "-", 120);
+
+  // ％とバー
+  $("#st-pct").textContent = (s.pct ?? 0) + "%";
+  $("#st-progress").value = s.pct ?? 0;
+  $("#st-progress").max = 100;
+
+  // 残り時間（推定）
+  $("#st-eta").textContent = s.eta_hms || "-";
+
+  // 待機残り
+  renderWait();
+
+  // ログリンク
+  $("#st-log").textContent = s.log_filename || "-";
+  if (s.log_filename) {
+    $("#st-loglink").innerHTML = ' - <a href="{{ url_for("download_log", filename="__F__") }}".replace("__F__", encodeURIComponent(s.log_filename)) target="_blank">ダウンロード</a>';
+  } else {
+    $("#st-loglink").textContent = "";
+  }
+}
+
+function apply(delta) {
+  Object.assign(S, delta);
+  if ("wait_remaining" in delta) waitDeadline = Date.now() + S.wait_remaining * 1000;
+  render(S);
+}
+
 async function poll() {
   try {
-    const res = await fetch("{{ url_for('status') }}?_=" + Date.now());
+    const res = await fetch("{{ url_for('status', job_id=job_id) }}?_=" + Date.now());
     if (!res.ok) throw new Error("HTTP " + res.status);
-    const s = await res.json();
-
-    $("#st-phase").textContent = s.phase;
-    $("#st-running").textContent = s.running;
-    $("#st-done").textContent = s.done;
-    $("#st-total").textContent = s.total;
-    $("#st-ok").textContent = s.ok;
-    $("#st-ng").textContent = s.ng;
-    $("#st-id").textContent = s.current_id || "-";
-    $("#st-text").textContent = fmtText(s.current_text || "-", 120);
-
-    // ％とバー
-    $("#st-pct").textContent = (s.pct ?? 0) + "%";
-    $("#st-progress").value = s.pct ?? 0;
-    $("#st-progress").max = 100;
-
-    // 残り時間（推定）
-    $("#st-eta").textContent = s.eta_hms || "-";
-
-    // 待機残り
-    if (s.phase === "waiting" && s.wait_remaining >= 0) {
-      $("#st-wait").textContent = s.wait_remaining + " 秒";
-    } else if (s.phase === "paused") {
-      $("#st-wait").textContent = "一時停止中";
-    } else {
-      $("#st-wait").textContent = "-";
+    apply(await res.json());
+  } catch(e) {
+    console.error(e);
+  } finally {
+    setTimeout(poll, 1200);
+  }
+}
+
+// 絞り込みを変えたら、解析済みの索引で件数だけ数え直す
+let previewTimer = null;
+function previewFilters() {
+  const form = $("#main-form");
+  if (!form.index_token.value) return;
+  clearTimeout(previewTimer);
+  previewTimer = setTimeout(async () => {
+    const fd = new FormData();
+    for (const el of form.querySelectorAll(".filters [name], [name=index_token]")) fd.append(el.name, el.value);
+    try {
+      const res = await fetch("{{ url_for('preview') }}", { method: "POST", body: fd });
+      const data = await res.json();
+      $("#preview-count").textContent = res.ok ? data.count : (data.error || "-");
+    } catch(e) {
+      console.error(e);
     }
+  }, 300);
+}
+for (const el of document.querySelectorAll(".filters [name]")) el.addEventListener("input", previewFilters);
 
-    // ログリンク
-    $("#st-log").textContent = s.log_filename || "-";
-    if (s.log_filename) {
-      $("#st-loglink").innerHTML = ' - <a href="{{ url_for("download_log", filename="__F__") }}".replace("__F__", encodeURIComponent(s.log_filename)) target="_blank">ダウンロード</a>';
+// ログ検索
+$("#btn-log-search").addEventListener("click", async () => {
+  const q = $("#log-search-id").value.trim();
+  if (!q) return;
+  try {
+    const res = await fetch("{{ url_for('search_logs') }}?id=" + encodeURIComponent(q));
+    const data = await res.json();
+    if (!res.ok) {
+      $("#log-search-result").textContent = data.error || ("HTTP " + res.status);
+    } else if (!data.results.length) {
+      $("#log-search-result").textContent = `ID ${data.id} はログに無かったよ`;
     } else {
-      $("#st-loglink").textContent = "";
+      $("#log-search-result").textContent = data.results
+        .map(r => `${r.response_at}  ${r.status}  ${r.log_filename}  ${fmtText(r.text || "", 60)}`).join("\\n");
     }
   } catch(e) {
     console.error(e);
-  } finally {
-    setTimeout(poll, 1200);
   }
+});
+
+setInterval(renderWait, 500);
+if (window.EventSource) {
+  const es = new EventSource("{{ url_for('events', job_id=job_id) }}");
+  es.onmessage = (ev) => apply(JSON.parse(ev.data));
+  es.onerror = () => {
+    // 再接続をあきらめた場合だけポーリングに切り替える
+    if (es.readyState === EventSource.CLOSED) poll();
+  };
+} else {
+  poll();
 }
-poll();
 </script>
 </body>
 </html>
 """
 
-# ====== ユーティリティ ======
-def make_auth(api_key: str, api_secret: str, access_token: str, access_secret: str) -> OAuth1:
-    return OAuth1(api_key, api_secret, access_token, access_secret)
+# ====== 絞り込み ======
+_index_cache: "OrderedDict[str, Tuple[float, TweetIndex]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+def _index_path(token: str) -> Optional[str]:
+    if not re.fullmatch(r"[0-9a-f]{32}", token or ""):
+        return None  # フォームから来た値なのでファイル名に使う前に形を確かめる
+    return os.path.join(INDEX_CACHE_DIR, f"{token}.idx")
 
-def verify_credentials(auth: OAuth1) -> Tuple[bool, int, str, dict]:
-    url = "https://api.twitter.com/1.1/account/verify_credentials.json?skip_status=true&include_email=false"
-    resp = requests.get(url, auth=auth, timeout=20)
-    if resp.status_code == 200:
-        data = resp.json()
-        return True, resp.status_code, "", data
-    return False, resp.status_code, resp.text, {}
+def _remember_locked(token: str, index: TweetIndex, now: float):
+    _index_cache[token] = (now, index)
+    _index_cache.move_to_end(token)
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
 
-def parse_twitter_created_at_to_jst(s: str) -> Optional[str]:
+def remember_index(index: TweetIndex) -> str:
+    """解析済みの索引を覚えて（メモリとディスク）、次のリクエストで使うためのトークンを返す"""
+    token = uuid.uuid4().hex
+    now = time.time()
+    for name in os.listdir(INDEX_CACHE_DIR):
+        path = os.path.join(INDEX_CACHE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > INDEX_CACHE_TTL_SEC:
+                os.remove(path)
+        except OSError:
+            pass  # ほかのプロセスが先に消した
+    index.save(_index_path(token))
+    with _index_cache_lock:
+        _remember_locked(token, index, now)
+    return token
+
+def lookup_index(token: str) -> Optional[TweetIndex]:
     """
-    Twitterの created_at (例: 'Mon Apr 06 22:19:45 +0000 2009') を
-    JST(+09:00) の ISO 文字列に変換する。失敗したら None。
+    トークンの索引。このプロセスが覚えていなければ（別のプロセスで解析した）ディスクから読む。
+    期限切れ・知らないトークンなら None
     """
+    path = _index_path(token)
+    if path is None:
+        return None
+    now = time.time()
+    with _index_cache_lock:
+        for k in [k for k, (t, _) in _index_cache.items() if now - t > INDEX_CACHE_TTL_SEC]:
+            del _index_cache[k]
+        hit = _index_cache.get(token)
+        if hit is not None:
+            _remember_locked(token, hit[1], now)
+    if hit is not None:
+        try:
+            os.utime(path)  # 使っている間は期限を延ばす（ほかのプロセスから見ても）
+        except OSError:
+            pass
+        return hit[1]
     try:
-        dt = eut.parsedate_to_datetime(s)   # tz-aware
-        return dt.astimezone(JST).isoformat(timespec="seconds")
-    except Exception:
+        if now - os.path.getmtime(path) > INDEX_CACHE_TTL_SEC:
+            return None
+        index = TweetIndex.load(path)
+        os.utime(path)
+    except (OSError, EOFError, ValueError):
         return None
+    with _index_cache_lock:
+        _remember_locked(token, index, now)
+    return index
 
-def parse_tweet_js(file_bytes: bytes) -> List[Dict[str, str]]:
-    """
-    tweet.js（window.YTD.tweets.part0 = ...）から
-    [{"id":"...", "text":"...", "posted_at":"..."}] の配列を返す。
-    削除順は「古い方から」にしたいので、この後でID昇順にソートする（Twitter Snowflakeは時間順）。
-    """
-    text = file_bytes.decode("utf-8", errors="replace").strip()
-    prefix = "window.YTD.tweets.part0 = "
-    if text.startswith(prefix):
-        text = text[len(prefix):]
-    while text and text[0] not in "[{":
-        text = text[1:]
-    data = json.loads(text)
-
-    items = []
-    for item in data:
-        if isinstance(item, dict) and "tweet" in item:
-            tw = item["tweet"]
-            tid = tw.get("id_str") or tw.get("id")
-            if not tid:
-                continue
-            ttext = tw.get("full_text") or tw.get("text") or ""
-            posted_at_iso = parse_twitter_created_at_to_jst(tw.get("created_at", ""))
-            items.append({"id": str(tid), "text": ttext, "posted_at": posted_at_iso})
-    # ★ 古い順（ID昇順）で並べ替え
-    items.sort(key=lambda x: int(x["id"]))
-    return items
-
-# ====== ログ ======
-def open_log() -> str:
-    ts = datetime.now(JST).strftime("%Y%m%d_%H%M%S")
-    filename = f"deleted_ids_{ts}.log"
-    path = os.path.join(LOG_DIR, filename)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"# Tweet Deleter Log {ts}\n")
-        f.write("# timezone: JST(+09:00)\n")
-        f.write("# format: <response_at_iso>\t<tweet_id>\t<status>\t<posted_at_iso>\t<text(head)>\n")
-    return filename
-
-def append_log(filename: str, tid: str, status: str, text_head: str,
-               response_at: Optional[datetime] = None,
-               posted_at_iso: Optional[str] = None):
-    path = os.path.join(LOG_DIR, filename)
-    head = (text_head or "").replace("\n", " ").strip()[:120]
-    now_iso = (response_at or datetime.now(JST)).isoformat(timespec="seconds")
-    posted = posted_at_iso or ""
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"{now_iso}\t{tid}\t{status}\t{posted}\t{head}\n")
-
-# ====== 補助：ETA表示用 ======
-def seconds_to_hms(sec: int) -> str:
-    h = sec // 3600
-    m = (sec % 3600) // 60
-    s = sec % 60
-    if h > 0:
-        return f"{h}時間{m}分{s}秒"
-    if m > 0:
-        return f"{m}分{s}秒"
-    return f"{s}秒"
-
-# ====== 実処理（1件ずつ＋待機中カウントダウン＋一時停止/キャンセル） ======
-def delete_tweets_incremental(auth: OAuth1, tweets: List[Dict[str, str]]):
-    with state_lock:
-        run_state.update({
-            "running": True, "phase": "processing", "message": "",
-            "total": len(tweets), "done": 0, "ok": 0, "ng": 0,
-            "current_id": None, "current_text": "",
-            "started_at": time.time(),
-            "wait_until": 0.0,
-            "log_filename": open_log(),
-        })
-        log_name = run_state["log_filename"]
-
+# ====== ルーティング ======
+@app.errorhandler(WorkerUnavailable)
+def worker_unavailable(e):
+    msg = f"削除を動かすプロセス（worker.py）に接続できなかったよ。python worker.py で起動してね。\n（{e}）"
+    if request.path.startswith(("/status", "/events", "/jobs", "/control", "/metrics", "/logs/")):
+        return jsonify({"error": msg}), 503
+    return render_template_string(HTML, message=msg, interval_sec=INTERVAL_SEC), 503
+
+@app.context_processor
+def inject_worker_limits():
     try:
-        for item in tweets:
-            # キャンセル？
-            if cancel_event.is_set():
-                with state_lock:
-                    run_state["phase"] = "canceled"
-                break
-
-            # ポーズ
-            while pause_event.is_set() and not cancel_event.is_set():
-                with state_lock:
-                    run_state["phase"] = "paused"
-                time.sleep(0.5)
-
-            if cancel_event.is_set():
-                with state_lock:
-                    run_state["phase"] = "canceled"
-                break
-
-            tid = item["id"]
-            ttext = item.get("text", "")
-            posted_at_iso = item.get("posted_at")  # 追加: 投稿時刻（JST）
-
-            # 表示用に更新
-            with state_lock:
-                run_state["phase"] = "processing"
-                run_state["current_id"] = tid
-                run_state["current_text"] = ttext
-
-            # 削除リクエスト
-            url = f"https://api.twitter.com/1.1/statuses/destroy/{tid}.json"
-            resp = requests.post(url, auth=auth, timeout=20)
-            response_at = datetime.now(JST)  # 追加: レスポンス返却時刻（JST）
-
-            if resp.status_code == 200:
-                with state_lock:
-                    run_state["ok"] += 1
-                append_log(log_name, tid, "OK", ttext, response_at, posted_at_iso)
-            else:
-                with state_lock:
-                    run_state["ng"] += 1
-                append_log(log_name, tid, f"NG({resp.status_code})", ttext, response_at, posted_at_iso)
-
-            with state_lock:
-                run_state["done"] += 1
-
-            # ここから待機（リアルタイム表示）
-            wait_until = time.time() + INTERVAL_SEC
-            with state_lock:
-                run_state["phase"] = "waiting"
-                run_state["wait_until"] = wait_until
-
-            while True:
-                if cancel_event.is_set():
-                    with state_lock:
-                        run_state["phase"] = "canceled"
-                    break
-                if pause_event.is_set():
-                    with state_lock:
-                        run_state["phase"] = "paused"
-                    time.sleep(0.5)
-                    continue
-                if time.time() >= wait_until:
-                    break
-                time.sleep(0.5)
-
-            if cancel_event.is_set():
-                break
-
-        # 終了
-        with state_lock:
-            if run_state["phase"] not in ("canceled", "error"):
-                run_state["phase"] = "finished"
-    except Exception as e:
-        with state_lock:
-            run_state["phase"] = "error"
-            run_state["message"] = f"{type(e).__name__}: {e}"
-    finally:
-        with state_lock:
-            run_state["running"] = False
-        pause_event.clear()
-        cancel_event.clear()
+        job_list = worker.call("snapshots")
+    except WorkerUnavailable:
+        job_list = []
+    # job_id を渡さずに描画するページ（エラー表示など）でも操作・進捗の URL が /control などになるよう、既定は None
+    return {"max_workers": MAX_WORKERS, "default_workers": DEFAULT_WORKERS,
+            "jobs": job_list, "job_id": None,
+            "ff": {}, "index_token": None, "preview_count": None, "index_total": None}
 
-# ====== ルーティング ======
 @app.route("/", methods=["GET"])
 def index():
-    return render_template_string(HTML, message=None, interval_sec=INTERVAL_SEC)
+    return render_template_string(HTML, message=None, job_id=request.args.get("job"), interval_sec=INTERVAL_SEC)
 
 @app.route("/handle", methods=["POST"])
 def handle():
@@ -410,14 +450,19 @@ def handle():
     access_token = request.form.get("access_token", "").strip()
     access_token_secret = request.form.get("access_token_secret", "").strip()
     action = request.form.get("action")
+    try:
+        workers = max(1, min(MAX_WORKERS, int(request.form.get("workers") or DEFAULT_WORKERS)))
+    except ValueError:
+        workers = DEFAULT_WORKERS
+    preflight = request.form.get("preflight") == "1"
 
     if not all([api_key, api_secret, access_token, access_token_secret]):
         return render_template_string(HTML, message="キーが不足してるよ！全部入れてね。", interval_sec=INTERVAL_SEC)
 
-    auth = make_auth(api_key, api_secret, access_token, access_token_secret)
+    keys = (api_key, api_secret, access_token, access_token_secret)
 
     if action == "check":
-        ok, status, text, data = verify_credentials(auth)
+        ok, status, text, data = worker.call("verify", keys=keys)
         if ok:
             msg = f"OK！ 認証できたよ。@{data.get('screen_name','')}（{data.get('name','')}）"
         else:
@@ -426,106 +471,179 @@ def handle():
             HTML,
             message=msg,
             api_key=api_key, api_secret=api_secret, access_token=access_token, access_token_secret=access_token_secret,
-            interval_sec=INTERVAL_SEC
+            workers=workers, interval_sec=INTERVAL_SEC
         )
 
-    if action == "run":
-        f = request.files.get("tweet_js")
-        if not f or f.filename == "":
-            return render_template_string(HTML, message="tweet.js を選んでね。", interval_sec=INTERVAL_SEC)
-
-        _ = secure_filename(f.filename)
-        file_bytes = f.read()
-
+    if action == "resume":
+        job_id = worker.call("resume", keys=keys, workers=workers, preflight=preflight)
+        if not job_id:
+            return render_template_string(HTML, message="再開できる中断ジョブが見つからなかったよ。", interval_sec=INTERVAL_SEC)
+        return render_template_string(HTML, message="中断していた削除を続きから再開したよ！パネルで進捗を見てね。",
+                                      job_id=job_id, interval_sec=INTERVAL_SEC)
+
+    if action in ("preview", "run"):
+        # 入力内容（キー・絞り込み・解析済みトークン）は画面に戻す
+        keep = dict(api_key=api_key, api_secret=api_secret, access_token=access_token,
+                    access_token_secret=access_token_secret, workers=workers, preflight=preflight, ff=request.form,
+                    interval_sec=INTERVAL_SEC)
         try:
-            tweets = parse_tweet_js(file_bytes)  # [{"id","text","posted_at"}...], ★この中で古い順に並べ替え済み
-        except Exception as e:
-            return render_template_string(HTML, message=f"tweet.js の解析でエラー: {e}", interval_sec=INTERVAL_SEC)
-
-        if not tweets:
-            return render_template_string(HTML, message="tweet.js からツイートIDを見つけられなかったよ…。", interval_sec=INTERVAL_SEC)
-
-        # 実行開始（バックグラウンド）
-        with state_lock:
-            run_state.update({"running": True, "phase": "processing", "message": ""})
-        t = threading.Thread(target=delete_tweets_incremental, args=(auth, tweets), daemon=True)
-        t.start()
-
-        return render_template_string(HTML, message="削除を開始したよ！パネルで進捗を見てね。", interval_sec=INTERVAL_SEC)
+            filters = parse_filters(request.form)
+        except ValueError as e:
+            return render_template_string(HTML, message=str(e), **keep)
+
+        files = [f for f in request.files.getlist("tweet_js") if f and f.filename]
+        if files:
+            _ = [secure_filename(f.filename) for f in files]
+            try:
+                # ★全パートをID昇順にマージして列ごとの索引にする
+                index = TweetIndex.build(f.stream for f in files)
+            except Exception as e:
+                return render_template_string(HTML, message=f"tweet.js の解析でエラー: {e}", **keep)
+            token = remember_index(index)
+        else:
+            token = request.form.get("index_token") or ""
+            index = lookup_index(token)
+            if index is None:
+                if token:
+                    # 解析から INDEX_CACHE_TTL_SEC 以上たった（どのプロセスにもディスクにも残っていない）
+                    msg = "解析済みの tweet.js の保存期限が切れたよ。もう一度ファイルを選んでね。"
+                    return render_template_string(HTML, message=msg, **keep)
+                return render_template_string(HTML, message="tweet.js を選んでね。", **keep)
+        keep["index_token"] = token
+        keep["index_total"] = len(index)
+
+        if not len(index):
+            return render_template_string(HTML, message="tweet.js からツイートIDを見つけられなかったよ…。", **keep)
+
+        rows = index.select(filters)
+        if action == "preview":
+            return render_template_string(
+                HTML, message=f"条件に合うツイートは {len(rows)} 件だよ（全 {len(index)} 件中。まだ削除はしていないよ）",
+                preview_count=len(rows), **keep)
+        if not rows:
+            return render_template_string(HTML, message="条件に合うツイートが無かったよ。", preview_count=0, **keep)
+
+        # 削除キュー（ID昇順）。本文・投稿時刻はまとめたバッファに持ち、1件ずつの dict は作らない
+        tweets = index.queue(rows)
+        del rows
+
+        # 同じ内容で中断したジョブがあればそこから続ける。過去のログで削除済みのIDは除外（worker 側で判定）
+        started = worker.call("submit", keys=keys, tweets=tweets, workers=workers, preflight=preflight)
+        del tweets
+        job_id, skipped = started["job_id"], started["skipped"]
+        if started["resumed"]:
+            return render_template_string(HTML, message="前回中断した同じ tweet.js のジョブを続きから再開したよ！",
+                                          job_id=job_id, interval_sec=INTERVAL_SEC)
+        if job_id is None:
+            return render_template_string(HTML, message=f"全部（{skipped}件）過去のログで削除済みだったよ。", interval_sec=INTERVAL_SEC)
+
+        msg = "削除を開始したよ！パネルで進捗を見てね。"
+        if skipped:
+            msg += f"（過去のログで削除済みの {skipped} 件はスキップしたよ）"
+        return render_template_string(HTML, message=msg, job_id=job_id, interval_sec=INTERVAL_SEC)
 
     return redirect(url_for("index"))
 
-@app.route("/control", methods=["POST"])
-def control():
-    cmd = request.form.get("cmd")
-    if cmd == "pause":
-        pause_event.set()
-    elif cmd == "resume":
-        pause_event.clear()
-    elif cmd == "cancel":
-        cancel_event.set()
+@app.route("/preview", methods=["POST"])
+def preview():
+    # 解析済みの索引で、絞り込み条件に合う件数だけを返す（画面の件数表示の即時更新用）
+    index = lookup_index(request.form.get("index_token") or "")
+    if index is None:
+        return jsonify({"error": "tweet.js を選び直してね"}), 404
+    try:
+        filters = parse_filters(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": index.count(filters), "total": len(index)})
+
+@app.route("/control", methods=["POST"], defaults={"job_id": None})
+@app.route("/control/<job_id>", methods=["POST"])
+def control(job_id):
+    # job_id 省略時は一番新しいジョブが対象
+    found = worker.call("control", job_id=job_id, cmd=request.form.get("cmd"))
+    if not found and job_id is not None:
+        return "job not found", 404
     return "ok"
 
-@app.route("/status")
-def status():
-    with state_lock:
-        s = dict(run_state)  # shallow copy
-
-    # 待機残り秒
-    wait_remaining = -1
-    if s.get("phase") == "waiting":
-        wait_remaining = max(0, int(s.get("wait_until", 0) - time.time()))
-    if s.get("phase") == "paused":
-        wait_remaining = -1
-
-    total = int(s.get("total") or 0)
-    done = int(s.get("done") or 0)
-    started_at = s.get("started_at")
-    now = time.time()
-
-    # 進捗％
-    pct = int((done / total) * 100) if total > 0 else 0
-
-    # ETA（実測ペースで自己補正、最低でもINTERVAL_SEC/件）
-    eta_seconds = 0
-    if total > 0 and done < total and started_at:
-        elapsed = max(0.0, now - float(started_at))
-        avg = max(INTERVAL_SEC, elapsed / done) if done > 0 else INTERVAL_SEC
-        items_left = total - done
-        eta_seconds = int(items_left * avg)
-        if wait_remaining and wait_remaining > 0:
-            eta_seconds += wait_remaining
-
-    def seconds_to_hms(sec: int) -> str:
-        h = sec // 3600
-        m = (sec % 3600) // 60
-        s2 = sec % 60
-        if h > 0:
-            return f"{h}時間{m}分{s2}秒"
-        if m > 0:
-            return f"{m}分{s2}秒"
-        return f"{s2}秒"
-
-    return jsonify({
-        "running": s.get("running"),
-        "total": total,
-        "done": done,
-        "ok": s.get("ok"),
-        "ng": s.get("ng"),
-        "current_id": s.get("current_id"),
-        "current_text": s.get("current_text"),
-        "phase": s.get("phase"),
-        "wait_remaining": wait_remaining,
-        "log_filename": s.get("log_filename"),
-        "message": s.get("message"),
-        "pct": pct,
-        "eta_seconds": eta_seconds,
-        "eta_hms": seconds_to_hms(eta_seconds),
-    })
+def job_status(job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """job_id のジョブの進捗（None なら一番新しいジョブ。ジョブが無ければ idle）。見つからなければ None"""
+    return worker.call("status", job_id=job_id)
+
+@app.route("/status", defaults={"job_id": None})
+@app.route("/status/<job_id>")
+def status(job_id):
+    # EventSource が使えない環境向けのポーリング用
+    body = worker.call("status_json", job_id=job_id)
+    if body is not None:
+        # 状態が変わったときだけ作り直した JSON をそのまま返す
+        return Response(body, mimetype="application/json")
+    st = job_status(job_id)
+    if st is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(st)
+
+@app.route("/events", defaults={"job_id": None})
+@app.route("/events/<job_id>")
+def events(job_id):
+    """
+    Server-Sent Events で進捗を流す。状態が変わったときだけ、変わった項目（差分）を送る。
+    最初の1通（と、job_id 省略時に対象ジョブが切り替わったとき）は全項目。
+    """
+    if job_status(job_id) is None:
+        return jsonify({"error": "job not found"}), 404
+
+    def stream():
+        seen = -1
+        last: Dict[str, Any] = {}
+        last_sent = 0.0
+        while True:
+            seen = worker.call("wait_change", seen=seen, timeout=SSE_KEEPALIVE_SEC)
+            current = job_status(job_id) or {}
+            if current.get("job_id") != last.get("job_id"):
+                last = {}
+            delta = {k: v for k, v in current.items() if k not in last or last[k] != v}
+            last = current
+            if delta:
+                last_sent = time.time()
+                yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+            elif time.time() - last_sent >= SSE_KEEPALIVE_SEC:
+                last_sent = time.time()
+                yield ": keepalive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/jobs")
+def list_jobs():
+    return jsonify(worker.call("jobs"))
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus のテキスト形式（API応答時間・レート枠・待ち時間・ロック待ちなど）。
+    # リクエストを送るのも削除ジョブも worker なので、worker の計測値をそのまま返す
+    return Response(worker.call("metrics"), content_type=metrics.CONTENT_TYPE)
+
+@app.route("/logs/search")
+def search_logs():
+    # ツイートID（URL でも可。…/status/<ID> の部分を使う）が、いつ・どの結果で記録されたか
+    q = request.args.get("id", "").strip()
+    found = re.search(r"/status(?:es)?/(\d+)", urlsplit(q).path) or re.fullmatch(r"(\d+)", q)
+    if not found:
+        return jsonify({"error": "id にツイートIDを指定してね"}), 400
+    tid = int(found.group(1))
+    return jsonify({"id": str(tid), "results": worker.call("log_search", tid=tid)})
+
+@app.route("/logs/summary")
+def summarize_logs():
+    # 状態ごと（NG はステータスコード別）・月ごとの件数
+    return jsonify(worker.call("log_summary"))
 
 @app.route("/logs/<path:filename>")
 def download_log(filename):
     return send_from_directory(LOG_DIR, filename, as_attachment=True)
 
 if __name__ == "__main__":
+    # 開発用サーバーで動かすときは worker も起動しておく（画面を止めても worker とジョブは残る）
+    if not worker.ensure_running():
+        print("worker.py を起動できなかったよ。別のターミナルで python worker.py を実行してね")
     app.run(debug=True)
@@ -0,0 +1,161 @@
+"""
+削除・取得のエンドツーエンド・スループット計測（本物の API には接続しない）。
+
+モックサーバー（bench.mock_api）を別プロセスで起動し、接続先とデータの置き場所を環境変数で差し替えてから
+  削除: 合成 tweet.js → TweetIndex → submit_job()（DeletionJob / JobManager）
+  取得: fetch_user_tweets_v2()
+を通しで実行する。件数ごとに 件数/秒・1リクエストの応答時間（p50 / p99）・プロセスのピークRSS を表示する。
+
+使い方（リポジトリ直下で）:
+    python -m bench.bench_e2e --sizes 1000 10000 100000 --workers 8 --latency-ms 20
+    python -m bench.bench_e2e --sizes 1000000 --skip-fetch
+    python -m bench.bench_e2e --sizes 10000 --missing-rate 0.5 --preflight   # 消えているIDは destroy を送らない
+
+ログ・ジョブDB・チェックポイントは一時ディレクトリに作るので、普段の logs/ や data/ には触れない。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from bench.bench_parse import write_synthetic_archive
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mib() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # macOS はバイト、Linux は KiB
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class LatencyRecorder:
+    """ApiClient のセッションに付けて、応答ごとの所要時間（送信〜ヘッダ受信）を集める"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: List[float] = []
+
+    def hook(self, resp, *args, **kwargs):
+        with self._lock:
+            self.values.append(resp.elapsed.total_seconds())
+
+    def take(self) -> List[float]:
+        with self._lock:
+            values, self.values = self.values, []
+        return values
+
+
+def start_mock_server(args: argparse.Namespace) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "bench.mock_api", "--port", "0",
+           "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+           "--rate-limit", str(args.rate_limit), "--window-sec", str(args.window_sec),
+           "--error-rate", str(args.error_rate), "--timeline-size", str(max(args.sizes)),
+           "--missing-rate", str(args.missing_rate)]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+
+
+def report(kind: str, n: int, workers: int, sec: float, latencies: List[float]):
+    rss = peak_rss_mib()
+    print(f"{kind:<7} {n:>9} {workers:>7} {sec:>8.2f} {n / sec if sec else 0:>9.1f} "
+          f"{percentile(latencies, 50) * 1000:>7.1f} {percentile(latencies, 99) * 1000:>7.1f} "
+          f"{'-' if rss is None else f'{rss:.1f}':>9}", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    ap.add_argument("--workers", type=int, default=8, help="削除の同時実行数")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate-limit", type=int, default=1_000_000)
+    ap.add_argument("--window-sec", type=float, default=900.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--missing-rate", type=float, default=0.0, help="最初から消えている扱いのIDの割合")
+    ap.add_argument("--preflight", action="store_true", help="削除の前に存在確認する")
+    ap.add_argument("--skip-delete", action="store_true")
+    ap.add_argument("--skip-fetch", action="store_true")
+    args = ap.parse_args()
+
+    server = start_mock_server(args)
+    home = tempfile.TemporaryDirectory()
+    try:
+        base = server.stdout.readline().strip()
+        os.environ["TWITTER_API_V1_BASE"] = f"{base}/1.1"
+        os.environ["TWITTER_API_V2_BASE"] = f"{base}/2"
+        os.environ["TWEET_TOOLS_HOME"] = home.name
+        # 環境変数を設定してから読み込む（接続先とデータの置き場所はモジュール読み込み時に決まる）
+        from api_client import credential_key
+        from deleter import make_client, open_engine, submit_job
+        from fetcher import client_for, fetch_user_tweets_v2, get_user_by_username
+        from tweet_index import TweetIndex
+
+        recorder = LatencyRecorder()
+        print(f"mock API: {base}  latency={args.latency_ms}ms ±{args.jitter_ms}ms  error_rate={args.error_rate}")
+        print(f"{'kind':<7} {'items':>9} {'workers':>7} {'sec':>8} {'items/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'RSS MiB':>9}")
+
+        if not args.skip_delete:
+            _, jobs = open_engine()
+            client = make_client("bench", "bench", "bench", "bench")
+            client.session.hooks["response"].append(recorder.hook)
+            account_key = credential_key(("oauth1", "bench", "bench"))
+            for run, n in enumerate(args.sizes):
+                path = os.path.join(home.name, f"tweet_{n}.js")
+                # 実行ごとにIDの範囲をずらす（削除済みIDの索引でスキップされないように）
+                write_synthetic_archive(path, n, id_base=1_300_000_000_000_000_000 + run * 5_000_000_000_000_000)
+                t0 = time.perf_counter()
+                index = TweetIndex.build([path])
+                queue = index.queue(range(len(index)))
+                del index
+                parse_sec = time.perf_counter() - t0
+                os.remove(path)
+
+                recorder.take()
+                t0 = time.perf_counter()
+                job, _, _ = submit_job(client, account_key, queue, args.workers, args.preflight)
+                del queue
+                seen = -1
+                while job.running:
+                    seen = jobs.wait_change(seen, 1.0)
+                sec = time.perf_counter() - t0
+                st = job.status()
+                assert st["done"] == n, st
+                report("delete", n, job.workers, sec, recorder.take())
+                print(f"{'':<7} parse {parse_sec:.2f}s / ok {st['ok']} ng {st['ng']} skipped {st['skipped']}", flush=True)
+
+        if not args.skip_fetch:
+            bearer = "bench"
+            client_for(bearer).session.hooks["response"].append(recorder.hook)
+            user = get_user_by_username(bearer, "mock")
+            for n in args.sizes:
+                recorder.take()
+                t0 = time.perf_counter()
+                tweets = fetch_user_tweets_v2(bearer, user["id"], n, include_rts=True, exclude_replies=False,
+                                              user_created_at=user.get("created_at"))
+                sec = time.perf_counter() - t0
+                assert len(tweets) == n, (len(tweets), n)
+                del tweets
+                report("fetch", n, 0, sec, recorder.take())
+    finally:
+        server.terminate()
+        server.wait()
+        home.cleanup()
+
+
+if __name__ == "__main__":
+    main()
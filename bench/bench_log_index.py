@@ -0,0 +1,97 @@
+"""
+ログ検索用の索引（log_index.LogIndex）のベンチマーク。
+
+使い方（リポジトリ直下で）:
+    python -m bench.bench_log_index --sizes 100000 1000000
+
+件数ごとに、合成した deleted_ids_*.log（--files 本に分けて書く）から
+  build    全ログを初めて取り込む時間
+  reload   保存した索引を読み込む時間（次回起動時）
+  append   1本のログに --append 行を追記したあとの差分取り込みの時間
+  search   1件の検索（ID→行）の平均時間
+  summary  集計の時間
+と、索引のディスク上の大きさを表示する。ログは一時ディレクトリに作る。
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from log_index import INDEX_DIRNAME, LogIndex
+from tweet_archive import JST
+
+STATUSES = ("OK",) * 90 + ("SKIP(gone)",) * 5 + ("RETRY(503)",) * 3 + ("NG(403)", "NG(429)")
+
+
+def write_logs(log_dir: str, n: int, files: int, id_base: int = 1_300_000_000_000_000_000) -> int:
+    """n 行のログを files 本に分けて書き、最後のIDの番号を返す"""
+    start = datetime(2023, 1, 1, tzinfo=JST)
+    per_file = (n + files - 1) // files
+    rnd = random.Random(0)
+    for k in range(files):
+        path = os.path.join(log_dir, f"deleted_ids_bench_{k:04d}.log")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# Tweet Deleter Log bench\n# timezone: JST(+09:00)\n")
+            for i in range(k * per_file, min(n, (k + 1) * per_file)):
+                at = (start + timedelta(seconds=i * 30)).isoformat(timespec="seconds")
+                posted = (start - timedelta(days=400) + timedelta(seconds=i * 60)).isoformat(timespec="seconds")
+                f.write(f"{at}\t{id_base + i * 4_194_304_000}\t{rnd.choice(STATUSES)}\t{posted}\tsynthetic tweet #{i}\n")
+    return n
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--files", type=int, default=20, help="ログを何本に分けるか")
+    ap.add_argument("--append", type=int, default=1_000, help="差分取り込みで追記する行数")
+    ap.add_argument("--queries", type=int, default=1_000)
+    args = ap.parse_args()
+
+    id_base = 1_300_000_000_000_000_000
+    print(f"{'lines':>9} {'build s':>8} {'reload s':>8} {'append ms':>9} {'search ms':>9} {'summary ms':>10} {'index MiB':>9}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as log_dir:
+            write_logs(log_dir, n, args.files, id_base)
+
+            t0 = time.perf_counter()
+            index = LogIndex(log_dir)
+            index.refresh()
+            build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            index = LogIndex(log_dir)
+            reload = time.perf_counter() - t0
+
+            path = os.path.join(log_dir, f"deleted_ids_bench_{args.files - 1:04d}.log")
+            with open(path, "a", encoding="utf-8") as f:
+                for i in range(n, n + args.append):
+                    f.write(f"2024-06-01T00:00:00+09:00\t{id_base + i * 4_194_304_000}\tOK\t\tappended #{i}\n")
+            t0 = time.perf_counter()
+            index.refresh()
+            append = time.perf_counter() - t0
+
+            rnd = random.Random(1)
+            ids = [id_base + rnd.randrange(n + args.append) * 4_194_304_000 for _ in range(args.queries)]
+            t0 = time.perf_counter()
+            for tid in ids:
+                assert index.search(tid), tid
+            search = (time.perf_counter() - t0) / len(ids)
+
+            t0 = time.perf_counter()
+            summary = index.summary()
+            summarize = time.perf_counter() - t0
+            assert summary["lines"] == n + args.append, summary["lines"]
+
+            size = dir_size(os.path.join(log_dir, INDEX_DIRNAME))
+            print(f"{n:>9} {build:>8.2f} {reload:>8.3f} {append * 1000:>9.1f} {search * 1000:>9.3f} "
+                  f"{summarize * 1000:>10.3f} {size / 2 ** 20:>9.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+tweet.js パーサのベンチマーク（旧: 全体を読み込んで json.loads / 新: ストリーム解析）。
+削除の絞り込み用の索引（index_record）も、投稿時刻を Snowflake ID から求める今の方式（index）と
+全件の created_at を RFC 2822 として解析していた方式（index-rfc2822）を比べる。
+
+使い方（リポジトリ直下で）:
+    python -m bench.bench_parse --sizes 10000 100000 1000000
+
+合成アーカイブを一時ディレクトリに作り、件数ごとに処理時間と tracemalloc のピークメモリを表示する。
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import email.utils as eut
+
+from tweet_archive import iter_tweet_archive, iter_tweets, parse_twitter_created_at_to_jst, snowflake_epoch
+from tweet_index import index_record
+from tweet_queue import NO_TIME
+
+
+def legacy_parse_tweet_js(file_bytes: bytes) -> List[Dict[str, Optional[str]]]:
+    """比較用：ストリーム化する前の parse_tweet_js（そのまま）"""
+    text = file_bytes.decode("utf-8", errors="replace").strip()
+    prefix = "window.YTD.tweets.part0 = "
+    if text.startswith(prefix):
+        text = text[len(prefix):]
+    while text and text[0] not in "[{":
+        text = text[1:]
+    data = json.loads(text)
+
+    items = []
+    for item in data:
+        if isinstance(item, dict) and "tweet" in item:
+            tw = item["tweet"]
+            tid = tw.get("id_str") or tw.get("id")
+            if not tid:
+                continue
+            ttext = tw.get("full_text") or tw.get("text") or ""
+            posted_at_iso = parse_twitter_created_at_to_jst(tw.get("created_at", ""))
+            items.append({"id": str(tid), "text": ttext, "posted_at": posted_at_iso})
+    items.sort(key=lambda x: int(x["id"]))
+    return items
+
+
+def legacy_index_record(tw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """比較用：投稿時刻を全件 created_at から読んでいたころの index_record（フラグ等は省略）"""
+    tid = tw.get("id_str") or tw.get("id")
+    if not tid:
+        return None
+    try:
+        created = int(eut.parsedate_to_datetime(tw.get("created_at", "")).timestamp())
+    except Exception:
+        created = NO_TIME
+    return {"id": str(tid), "text": tw.get("full_text") or tw.get("text") or "", "created": created}
+
+
+def write_synthetic_archive(path: str, n: int, part: int = 0, id_base: int = 1_300_000_000_000_000_000):
+    """n 件の合成 tweet.js を書き出す（新しい順に並ぶ本物のアーカイブに合わせてID降順）"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"window.YTD.tweets.part{part} = [")
+        for i in range(n):
+            tid = id_base + (n - i) * 4_194_304 * 1000  # 1秒おきの Snowflake ID
+            created_at = time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(snowflake_epoch(tid)))
+            tweet = {
+                "tweet": {
+                    "id_str": str(tid), "id": str(tid),
+                    "created_at": created_at,
+                    "full_text": f"synthetic tweet #{i} " + "あいうえお" * 10,
+                    "favorite_count": str(i % 17), "retweet_count": str(i % 5),
+                    "entities": {"hashtags": [], "urls": [], "user_mentions": []},
+                }
+            }
+            f.write(("," if i else "") + "\n  " + json.dumps(tweet, ensure_ascii=False))
+        f.write("\n]\n")
+
+
+def measure(fn: Callable[[], int]):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-legacy-over", type=int, default=None,
+                    help="この件数を超えるサイズでは旧パーサを省略する（メモリ不足対策）")
+    args = ap.parse_args()
+
+    print(f"{'tweets':>9} {'parser':<13} {'sec':>8} {'peak MiB':>9} {'file MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f"tweet_{n}.js")
+            write_synthetic_archive(path, n)
+            size_mib = os.path.getsize(path) / 2 ** 20
+
+            def run_stream() -> int:
+                return sum(1 for _ in iter_tweets(path))
+
+            def run_legacy() -> int:
+                with open(path, "rb") as f:
+                    return len(legacy_parse_tweet_js(f.read()))
+
+            def run_index() -> int:
+                return sum(1 for _ in iter_tweet_archive([path], record=index_record))
+
+            def run_index_rfc() -> int:
+                return sum(1 for _ in iter_tweet_archive([path], record=legacy_index_record))
+
+            runs = [("streaming", run_stream), ("index", run_index), ("index-rfc2822", run_index_rfc)]
+            if args.skip_legacy_over is None or n <= args.skip_legacy_over:
+                runs.append(("legacy", run_legacy))
+            for name, fn in runs:
+                count, sec, peak = measure(fn)
+                assert count == n, (name, count, n)
+                print(f"{n:>9} {name:<13} {sec:>8.2f} {peak / 2 ** 20:>9.1f} {size_mib:>9.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+削除キューのメモリベンチマーク（旧: {"seq","id","text","posted_at"} の dict のリスト / 新: TweetQueue）。
+
+使い方（リポジトリ直下で）:
+    python -m bench.bench_queue --sizes 10000 100000 1000000
+
+件数ごとに、キューを作った後に残っているメモリ（tracemalloc）と作成にかかった時間を表示する。
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from tweet_queue import TweetQueue, format_posted_at
+
+TEXT_HEAD_LEN = 120  # job_store と同じく本文は先頭だけ
+
+
+def synthetic_rows(n: int, id_base: int = 1_300_000_000_000_000_000):
+    for i in range(n):
+        text = (f"synthetic tweet #{i} " + "あいうえお" * 10)[:TEXT_HEAD_LEN]
+        yield i, id_base + i * 4_194_304 * 1000, text, 1_600_000_000 + i * 60
+
+
+def build_dicts(n: int) -> List[Dict[str, Any]]:
+    """比較用：TweetQueue にする前の pending_items の形"""
+    return [{"seq": seq, "id": str(tid), "text": text, "posted_at": format_posted_at(created)}
+            for seq, tid, text, created in synthetic_rows(n)]
+
+
+def build_queue(n: int) -> TweetQueue:
+    q = TweetQueue()
+    for seq, tid, text, created in synthetic_rows(n):
+        q.append(tid, text, created, seq)
+    return q
+
+
+def retained(fn: Callable[[int], Any], n: int):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = fn(n)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(obj) == n
+    del obj
+    return elapsed, current
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = ap.parse_args()
+
+    print(f"{'tweets':>9} {'queue':<10} {'sec':>8} {'MiB':>9} {'B/tweet':>8}")
+    for n in args.sizes:
+        for name, fn in (("dicts", build_dicts), ("TweetQueue", build_queue)):
+            sec, mem = retained(fn, n)
+            print(f"{n:>9} {name:<10} {sec:>8.2f} {mem / 2 ** 20:>9.1f} {mem / n:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+ベンチマーク用のローカル Twitter API もどき（標準ライブラリの http.server だけで動く）。
+
+対応エンドポイント:
+    POST /1.1/statuses/destroy/<id>.json         削除（同じIDの2回目以降は 404）
+    GET  /1.1/account/verify_credentials.json
+    GET  /2/users/by/username/<username>
+    GET  /2/users/<id>/tweets                     max_results / pagination_token / start_time / end_time / since_id
+    GET  /2/tweets?ids=<id,...>                   存在確認（削除済み・--missing-rate 分は Not Found Error）
+
+タイムラインは --timeline-size 件の合成データ（アカウント作成日から現在まで等間隔、IDは投稿時刻から作る Snowflake）。
+応答ごとに x-rate-limit-* ヘッダを付け、枠を使い切ると 429 を返す。--error-rate で 503 / 429 を混ぜられる。
+--missing-rate を指定すると、その割合のIDを最初から消えている扱いにする（IDから決まるので実行ごとに同じ）。
+
+使い方（リポジトリ直下で）:
+    python -m bench.mock_api --port 8765 --latency-ms 50 --rate-limit 300 --window-sec 900
+    TWITTER_API_V1_BASE=http://127.0.0.1:8765/1.1 TWITTER_API_V2_BASE=http://127.0.0.1:8765/2 python cli.py ...
+
+起動すると1行目に接続先（http://127.0.0.1:<port>）を出す。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+TWEPOCH_MS = 1288834974657  # Snowflake の起点（2010-11-04）
+ACCOUNT_CREATED = datetime(2011, 1, 1, tzinfo=timezone.utc)
+USER_ID = "1000"
+
+_DESTROY = re.compile(r"^/1\.1/statuses/destroy/(\d+)\.json$")
+_USER_BY_NAME = re.compile(r"^/2/users/by/username/([^/]+)$")
+_USER_TWEETS = re.compile(r"^/2/users/(\d+)/tweets$")
+
+
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class Timeline:
+    """
+    n 件の合成タイムライン。i 件目（古い順）の投稿時刻と ID は計算で求めるので、100万件でも保持しない。
+    """
+
+    def __init__(self, n: int, since: datetime = ACCOUNT_CREATED):
+        self.n = n
+        self.start = since.timestamp()
+        self.span = max(1.0, time.time() - self.start)
+
+    def ts(self, i: int) -> float:
+        return self.start + self.span * i / max(1, self.n)
+
+    def tweet_id(self, i: int) -> int:
+        ms = int(self.ts(i) * 1000)
+        return ((ms - TWEPOCH_MS) << 22) | (i & 0x3FFFFF)
+
+    def tweet(self, i: int) -> Dict[str, Any]:
+        created = datetime.fromtimestamp(self.ts(i), timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        return {
+            "id": str(self.tweet_id(i)), "text": f"mock tweet #{i}", "created_at": created, "lang": "ja",
+            "public_metrics": {"retweet_count": i % 5, "like_count": i % 17}, "entities": {},
+        }
+
+    def _first(self, pred) -> int:
+        """pred(i) が初めて真になる i（pred は i について単調）"""
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pred(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _first_at_or_after(self, ts: float) -> int:
+        return self._first(lambda i: self.ts(i) >= ts)
+
+    def _first_id_above(self, tid: int) -> int:
+        return self._first(lambda i: self.tweet_id(i) > tid)
+
+    def page(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """新しい順のページ。pagination_token は「範囲内で何件目から」"""
+        lo, hi = 0, self.n
+        if params.get("start_time"):
+            lo = max(lo, self._first_at_or_after(_parse_time(params["start_time"])))
+        if params.get("end_time"):
+            hi = min(hi, self._first_at_or_after(_parse_time(params["end_time"])))
+        if params.get("since_id"):
+            lo = max(lo, self._first_id_above(int(params["since_id"])))
+        size = max(5, min(100, int(params.get("max_results") or 10)))
+        offset = int(params.get("pagination_token") or 0)
+        top = hi - 1 - offset
+        rows = range(top, max(lo, top - size + 1) - 1, -1) if top >= lo else range(0)
+        body: Dict[str, Any] = {"meta": {"result_count": len(rows)}}
+        if rows:
+            body["data"] = [self.tweet(i) for i in rows]
+            if rows[-1] > lo:
+                body["meta"]["next_token"] = str(offset + len(rows))
+        return body
+
+
+class RateWindow:
+    """エンドポイントごとの「window_sec 秒あたり limit 回」の枠"""
+
+    def __init__(self, limit: int, window_sec: float):
+        self.limit = limit
+        self.window_sec = window_sec
+        self._lock = threading.Lock()
+        self._reset = time.time() + window_sec
+        self._used = 0
+
+    def take(self) -> Tuple[bool, Dict[str, str]]:
+        with self._lock:
+            now = time.time()
+            if now >= self._reset:
+                self._reset, self._used = now + self.window_sec, 0
+            allowed = self._used < self.limit
+            if allowed:
+                self._used += 1
+            headers = {
+                "x-rate-limit-limit": str(self.limit),
+                "x-rate-limit-remaining": str(max(0, self.limit - self._used)),
+                "x-rate-limit-reset": str(int(self._reset)),
+            }
+        return allowed, headers
+
+
+class MockTwitterAPI:
+    """スレッドで動くモックサーバー。start() で接続先 URL を返す"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 rate_limit: int = 1_000_000, window_sec: float = 900.0, error_rate: float = 0.0,
+                 timeline_size: int = 3200, missing_rate: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.timeline = Timeline(timeline_size)
+        self._windows = {name: RateWindow(rate_limit, window_sec) for name in ("destroy", "verify", "user", "tweets", "lookup")}
+        self._deleted: set = set()
+        self._deleted_lock = threading.Lock()
+        self.requests = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive（クライアントの接続プールを本番と同じように使わせる）
+            # ヘッダと本文を1回で送る（分けて送ると Nagle と遅延ACKで1往復40msほど余計にかかる）
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                api.handle(self, "GET")
+
+            def do_POST(self):
+                api.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _missing(self, tid: str) -> bool:
+        """最初から消えている扱いのIDか（IDの CRC32 で決める）"""
+        return bool(self.missing_rate) and zlib.crc32(tid.encode()) % 10_000 < self.missing_rate * 10_000
+
+    # ---- 応答 ----
+    def _send(self, h: BaseHTTPRequestHandler, status: int, body: Dict[str, Any], headers: Dict[str, str]):
+        data = json.dumps(body).encode("utf-8")
+        h.send_response(status)
+        h.send_header("Content-Type", "application/json; charset=utf-8")
+        h.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            h.send_header(k, v)
+        h.end_headers()
+        h.wfile.write(data)
+
+    def handle(self, h: BaseHTTPRequestHandler, method: str):
+        length = int(h.headers.get("Content-Length") or 0)
+        if length:
+            h.rfile.read(length)
+        self.requests += 1
+        url = urlparse(h.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        route = None
+        if method == "POST" and _DESTROY.match(url.path):
+            route = "destroy"
+        elif method == "GET" and url.path == "/1.1/account/verify_credentials.json":
+            route = "verify"
+        elif method == "GET" and _USER_BY_NAME.match(url.path):
+            route = "user"
+        elif method == "GET" and _USER_TWEETS.match(url.path):
+            route = "tweets"
+        elif method == "GET" and url.path == "/2/tweets":
+            route = "lookup"
+        if route is None:
+            self._send(h, 404, {"errors": [{"message": "Sorry, that page does not exist"}]}, {})
+            return
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        allowed, headers = self._windows[route].take()
+        if not allowed:
+            self._send(h, 429, {"errors": [{"message": "Rate limit exceeded"}]}, headers)
+            return
+        if self.error_rate and random.random() < self.error_rate:
+            status = random.choice((503, 429))
+            self._send(h, status, {"errors": [{"message": "Injected error"}]}, headers)
+            return
+
+        if route == "destroy":
+            tid = _DESTROY.match(url.path).group(1)
+            with self._deleted_lock:
+                gone = tid in self._deleted or self._missing(tid)
+                self._deleted.add(tid)
+            if gone:
+                self._send(h, 404, {"errors": [{"code": 144, "message": "No status found with that ID."}]}, headers)
+            else:
+                self._send(h, 200, {"id_str": tid}, headers)
+        elif route == "lookup":
+            ids = [t for t in params.get("ids", "").split(",") if t.isdigit()][:100]
+            with self._deleted_lock:
+                gone = {t for t in ids if t in self._deleted or self._missing(t)}
+            body: Dict[str, Any] = {}
+            live = [{"id": t, "text": "mock tweet"} for t in ids if t not in gone]
+            if live:
+                body["data"] = live
+            if gone:
+                body["errors"] = [{"value": t, "detail": f"Could not find tweet with ids: [{t}].",
+                                   "title": "Not Found Error", "resource_type": "tweet", "parameter": "ids",
+                                   "resource_id": t, "type": "https://api.twitter.com/2/problems/resource-not-found"}
+                                  for t in ids if t in gone]
+            self._send(h, 200, body, headers)
+        elif route == "verify":
+            self._send(h, 200, {"id_str": USER_ID, "screen_name": "mock", "name": "Mock User"}, headers)
+        elif route == "user":
+            username = _USER_BY_NAME.match(url.path).group(1)
+            created = ACCOUNT_CREATED.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            self._send(h, 200, {"data": {"id": USER_ID, "username": username, "name": "Mock User",
+                                         "created_at": created}}, headers)
+        else:
+            self._send(h, 200, self.timeline.page(params), headers)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765, help="0 なら空いているポート")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="応答ごとの遅延")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="遅延のゆらぎ（±）")
+    ap.add_argument("--rate-limit", type=int, default=1_000_000, help="エンドポイントごとの窓あたり回数")
+    ap.add_argument("--window-sec", type=float, default=900.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="503/429 を返す割合（0〜1）")
+    ap.add_argument("--timeline-size", type=int, default=3200)
+    ap.add_argument("--missing-rate", type=float, default=0.0, help="最初から消えている扱いにするIDの割合（0〜1）")
+    args = ap.parse_args()
+
+    api = MockTwitterAPI(args.host, args.port, args.latency_ms, args.jitter_ms, args.rate_limit,
+                         args.window_sec, args.error_rate, args.timeline_size, args.missing_rate)
+    print(api.url, flush=True)
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
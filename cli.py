@@ -0,0 +1,240 @@
+"""
+ブラウザを使わずに削除・取得を実行するコマンドライン版（Flask は読み込まない）。
+
+使い方（リポジトリ直下で）:
+    python cli.py delete tweet.js [tweets-part1.js ...] [--workers 4] [--until-date 2020-01-01] [--dry-run]
+    python cli.py delete --resume
+    python cli.py fetch USERNAME -o tweets.js [--count 3200]
+
+認証情報は環境変数（TWITTER_API_KEY / TWITTER_API_SECRET / TWITTER_ACCESS_TOKEN /
+TWITTER_ACCESS_TOKEN_SECRET / TWITTER_BEARER_TOKEN）か、--credentials で渡す JSON ファイル
+（キー: api_key, api_secret, access_token, access_token_secret, bearer）から読む。両方あればファイルが優先。
+
+進捗は標準出力に JSON Lines（1行1イベント）で出す。終了コード:
+    0 完了 / 1 実行中のエラー / 2 引数・入力の誤り / 3 認証エラー / 130 中断（Ctrl+C・SIGTERM。続きから再開できる）
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from api_client import credential_key
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_AUTH = 3
+EXIT_INTERRUPTED = 130
+
+CREDENTIAL_ENV = {
+    "api_key": "TWITTER_API_KEY",
+    "api_secret": "TWITTER_API_SECRET",
+    "access_token": "TWITTER_ACCESS_TOKEN",
+    "access_token_secret": "TWITTER_ACCESS_TOKEN_SECRET",
+    "bearer": "TWITTER_BEARER_TOKEN",
+}
+
+PROGRESS_INTERVAL_SEC = 1.0   # 削除の進捗を出す間隔
+FETCH_PROGRESS_EVERY = 100    # 取得の進捗を出す件数
+
+
+def emit(event: str, **fields: Any):
+    """進捗を JSON Lines で1行出す"""
+    line = {"event": event, "time": datetime.now().astimezone().isoformat(timespec="seconds"), **fields}
+    print(json.dumps(line, ensure_ascii=False), flush=True)
+
+
+def load_credentials(path: Optional[str]) -> Dict[str, str]:
+    creds = {key: os.environ.get(env, "").strip() for key, env in CREDENTIAL_ENV.items()}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        creds.update({k: str(v).strip() for k, v in data.items() if k in CREDENTIAL_ENV and v})
+    return creds
+
+
+# ====== 削除 ======
+def run_delete(args: argparse.Namespace, creds: Dict[str, str]) -> int:
+    from deleter import make_client, open_engine, submit_job, verify_credentials
+    from tweet_index import TweetIndex, parse_filters
+
+    keys = [creds["api_key"], creds["api_secret"], creds["access_token"], creds["access_token_secret"]]
+    if not all(keys):
+        emit("error", kind="usage", message="API_KEY / API_SECRET / ACCESS_TOKEN / ACCESS_TOKEN_SECRET が必要です")
+        return EXIT_USAGE
+    if not args.resume and not args.files:
+        emit("error", kind="usage", message="tweet.js（またはアーカイブZIP）を指定してください")
+        return EXIT_USAGE
+    try:
+        filters = parse_filters(vars(args))
+    except ValueError as e:
+        emit("error", kind="usage", message=str(e))
+        return EXIT_USAGE
+
+    tweets = None
+    if not args.resume:
+        try:
+            index = TweetIndex.build(args.files)
+        except Exception as e:
+            emit("error", kind="parse", message=f"{type(e).__name__}: {e}")
+            return EXIT_USAGE
+        rows = index.select(filters)
+        emit("parsed", total=len(index), selected=len(rows))
+        if args.dry_run or not rows:
+            return EXIT_OK
+        tweets = index.queue(rows)
+        del index, rows
+
+    client = make_client(*keys)
+    ok, status, text, data = verify_credentials(client)
+    if not ok:
+        emit("error", kind="auth", status=status, message=text[:500])
+        return EXIT_AUTH
+    emit("authenticated", screen_name=data.get("screen_name", ""))
+    account_key = credential_key(("oauth1", creds["api_key"], creds["access_token"]))
+    job_store, jobs = open_engine()
+    job_store.mark_interrupted()
+
+    if args.resume:
+        resumable = job_store.find_resumable(account_key)
+        if not resumable:
+            emit("error", kind="usage", message="再開できる中断ジョブがありません")
+            return EXIT_USAGE
+        job, resumed, skipped = jobs.start(client, account_key, resumable["job_id"], args.workers,
+                                           args.preflight), True, 0
+    else:
+        job, resumed, skipped = submit_job(client, account_key, tweets, args.workers, args.preflight)
+        del tweets
+    if job is None:
+        emit("finished", skipped=skipped, message="すべて過去のログで削除済みです")
+        return EXIT_OK
+    emit("started", job_id=job.job_id, resumed=resumed, skipped=skipped)
+
+    interrupted: List[int] = []
+
+    def on_signal(signum, frame):
+        # 新規送信を止め、応答待ちを処理し終えてから終了する（続きは --resume で再開）
+        interrupted.append(signum)
+        job.control("cancel")
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    seen, last = -1, 0.0
+    while job.running:
+        seen = jobs.wait_change(seen, PROGRESS_INTERVAL_SEC)
+        if time.time() - last >= PROGRESS_INTERVAL_SEC:
+            last = time.time()
+            st = job.status()
+            emit("progress", **{k: st[k] for k in ("done", "total", "ok", "ng", "skipped", "retrying", "phase", "inflight", "eta_seconds")})
+
+    st = job.status()
+    emit(st["phase"], **{k: st[k] for k in ("job_id", "done", "total", "ok", "ng", "skipped", "outcomes", "log_filename", "message")})
+    if st["phase"] == "finished":
+        return EXIT_OK
+    if st["phase"] == "canceled" and interrupted:
+        return EXIT_INTERRUPTED
+    if st["outcomes"]["fatal"]:
+        return EXIT_AUTH
+    return EXIT_ERROR
+
+
+# ====== 取得 ======
+def run_fetch(args: argparse.Namespace, creds: Dict[str, str]) -> int:
+    from fetcher import get_user_by_username, iter_timeline, iter_tweets_js
+
+    bearer = creds["bearer"]
+    if not bearer:
+        emit("error", kind="usage", message="Bearer Token（TWITTER_BEARER_TOKEN）が必要です")
+        return EXIT_USAGE
+    try:
+        user = get_user_by_username(bearer, args.username.lstrip("@"))
+    except Exception as e:
+        emit("error", kind="user", message=f"{type(e).__name__}: {e}")
+        return EXIT_ERROR
+    emit("user", id=user["id"], username=user.get("username"))
+
+    statuses = iter_timeline(bearer, user, args.count, include_rts=not args.no_retweets,
+                             exclude_replies=args.exclude_replies, use_cache=not args.no_cache)
+    fetched = 0
+    failures: List[BaseException] = []
+
+    def counted():
+        nonlocal fetched
+        try:
+            for tw in statuses:
+                fetched += 1
+                if fetched % FETCH_PROGRESS_EVERY == 0:
+                    emit("progress", fetched=fetched, total=args.count)
+                yield tw
+        except Exception as e:
+            failures.append(e)
+            raise
+
+    # 書き終えてから置き換える（途中で止まっても前のファイルは壊さない）
+    tmp = args.output + ".part"
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in iter_tweets_js(counted()):
+                f.write(chunk)
+    except KeyboardInterrupt:
+        os.remove(tmp)
+        emit("canceled", fetched=fetched)
+        return EXIT_INTERRUPTED
+    if failures:
+        os.remove(tmp)
+        e = failures[0]
+        emit("error", kind="fetch", fetched=fetched, message=f"{type(e).__name__}: {e}")
+        return EXIT_ERROR
+    os.replace(tmp, args.output)
+    emit("finished", fetched=fetched, output=args.output)
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--credentials", help="認証情報の JSON ファイル")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    d = sub.add_parser("delete", help="tweet.js のツイートを削除する")
+    d.add_argument("files", nargs="*", help="tweet.js / tweets-partN.js / アーカイブZIP")
+    d.add_argument("--workers", type=int, default=1, help="同時実行数（1〜8）")
+    d.add_argument("--resume", action="store_true", help="このアカウントの中断ジョブを続きから再開する")
+    d.add_argument("--dry-run", action="store_true", help="対象件数を表示するだけで削除しない")
+    d.add_argument("--preflight", action="store_true", help="削除の前に100件ずつ存在確認し、消えているものは送らない")
+    d.add_argument("--since-date", help="この日以降（YYYY-MM-DD、JST）")
+    d.add_argument("--until-date", help="この日より前（YYYY-MM-DD、JST）")
+    d.add_argument("--retweets", choices=("include", "exclude", "only"), default="include")
+    d.add_argument("--replies", choices=("include", "exclude", "only"), default="include")
+    d.add_argument("--max-likes", type=int, help="いいね数がこれ以下")
+    d.add_argument("--max-rts", type=int, help="RT数がこれ以下")
+    d.add_argument("--pattern", help="本文の正規表現")
+
+    f = sub.add_parser("fetch", help="ユーザーのツイートを取得して tweets.js に書き出す")
+    f.add_argument("username")
+    f.add_argument("-o", "--output", default="tweets.js")
+    f.add_argument("--count", type=int, default=200, help="取得件数（最大3200）")
+    f.add_argument("--no-retweets", action="store_true", help="リツイートを含めない")
+    f.add_argument("--exclude-replies", action="store_true", help="リプライを除外する")
+    f.add_argument("--no-cache", action="store_true", help="前回の取得結果を使わずに取り直す")
+    return ap
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        creds = load_credentials(args.credentials)
+    except (OSError, ValueError) as e:
+        emit("error", kind="usage", message=f"認証情報ファイルを読めません: {e}")
+        return EXIT_USAGE
+    if args.command == "delete":
+        return run_delete(args, creds)
+    return run_fetch(args, creds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import bisect
+import heapq
+import json
+import os
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from log_tail import iter_records, log_sizes, read_new_lines
+
+INDEX_FILENAME = ".deleted_index.bin"       # ソート済み uint64 配列（Snowflake ID）
+MANIFEST_FILENAME = ".deleted_index.json"   # ログごとの読み込み済みバイト位置
+SKIP_STATUSES = ("OK", "SKIP(gone)")       # この結果が記録されたIDは次回以降スキップする
+_SKIP_STATUS_BYTES = frozenset(s.encode("ascii") for s in SKIP_STATUSES)
+
+
+class DeletedIndex:
+    """
+    LOG_DIR の deleted_ids_*.log から「もう削除できたID」の索引を作る。
+    索引はソート済みの64bit整数配列としてディスクに保存し、ログは前回読んだ位置から差分だけ読む。
+    """
+
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+        self.index_path = os.path.join(log_dir, INDEX_FILENAME)
+        self.manifest_path = os.path.join(log_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._ids = array("Q")        # ソート済み・重複なし
+        self._recent: Set[int] = set()  # 実行中に追加されたID（次の refresh で配列に取り込む）
+        self._offsets: Dict[str, int] = {}
+        self._load()
+
+    # ---- 永続化 ----
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                offsets = json.load(f).get("offsets", {})
+            ids = array("Q")
+            with open(self.index_path, "rb") as f:
+                ids.frombytes(f.read())
+        except (OSError, ValueError):
+            return  # 無い・壊れている → 全ログを読み直す
+        self._ids, self._offsets = ids, offsets
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            self._ids.tofile(f)
+        os.replace(tmp, self.index_path)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "offsets": self._offsets}, f)
+        os.replace(tmp, self.manifest_path)
+
+    # ---- 更新 ----
+    def _read_new_lines(self, filename: str, offset: int, size: int) -> Tuple[List[int], int]:
+        if size < offset:
+            offset = 0  # 書き直されたログ → 最初から
+        data, new_offset = read_new_lines(os.path.join(self.log_dir, filename), offset)
+        found: List[int] = []
+        for _, cols in iter_records(data, offset, 3):
+            if len(cols) >= 3 and cols[2] in _SKIP_STATUS_BYTES:
+                try:
+                    found.append(int(cols[1]))
+                except ValueError:
+                    pass
+        return found, new_offset
+
+    def refresh(self):
+        """ログの追記分を索引に取り込み、ディスクに保存する"""
+        with self._lock:
+            new_ids: Set[int] = set(self._recent)
+            sizes = log_sizes(self.log_dir)
+            names = list(sizes)
+            changed = bool(self._recent) or set(self._offsets) != set(names)
+            for name, size in sizes.items():
+                offset = self._offsets.get(name, 0)
+                if size == offset:
+                    continue
+                try:
+                    found, new_offset = self._read_new_lines(name, offset, size)
+                except OSError:
+                    continue
+                if new_offset != offset:
+                    changed = True
+                new_ids.update(found)
+                self._offsets[name] = new_offset
+            for gone in set(self._offsets) - set(names):
+                del self._offsets[gone]  # ログを消しても、そのIDが削除済みなのは変わらない
+            if new_ids:
+                fresh = sorted(i for i in new_ids if not self._contains_sorted(i))
+                self._ids = array("Q", heapq.merge(self._ids, fresh))
+            self._recent.clear()
+            if changed:
+                self._save()
+
+    def add(self, tid: Any):
+        """削除に成功したIDをすぐに反映する（ログへの追記と同時に呼ぶ）"""
+        try:
+            value = int(tid)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._recent.add(value)
+
+    # ---- 参照 ----
+    def _contains_sorted(self, value: int) -> bool:
+        i = bisect.bisect_left(self._ids, value)
+        return i < len(self._ids) and self._ids[i] == value
+
+    def __contains__(self, tid: Any) -> bool:
+        try:
+            value = int(tid)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            return value in self._recent or self._contains_sorted(value)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids) + sum(1 for i in self._recent if not self._contains_sorted(i))
+
+    def new_positions(self, ids: Iterable[int]) -> Tuple[List[int], int]:
+        """ids のうち索引に無いものの位置を返す（戻り値: (位置, スキップ件数)。TweetQueue.select 用）"""
+        kept: List[int] = []
+        skipped = 0
+        with self._lock:
+            for pos, value in enumerate(ids):
+                if value in self._recent or self._contains_sorted(value):
+                    skipped += 1
+                else:
+                    kept.append(pos)
+        return kept, skipped
+
+    def filter_new(self, tweets: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """索引に無いツイートだけを返す（戻り値: (残り, スキップ件数)）"""
+        kept: List[Dict[str, Any]] = []
+        skipped = 0
+        with self._lock:
+            for t in tweets:
+                try:
+                    value = int(t["id"])
+                except (TypeError, ValueError):
+                    kept.append(t)
+                    continue
+                if value in self._recent or self._contains_sorted(value):
+                    skipped += 1
+                else:
+                    kept.append(t)
+        return kept, skipped
@@ -0,0 +1,840 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+import requests
+from requests_oauthlib import OAuth1
+
+import metrics
+from api_client import ApiClient, get_client
+from deleted_index import DeletedIndex
+from job_store import JobStore, fingerprint_ids
+from rate_limit import RateLimitScheduler
+from settings import DATA_DIR, DEFAULT_WORKERS, INTERVAL_SEC, LOG_DIR, MAX_WORKERS
+from tweet_archive import JST
+from tweet_queue import NO_TIME, TweetQueue, format_posted_at
+
+# ====== 基本設定 ======
+# 接続先（ベンチマークでは環境変数でモックサーバーに向ける）。データの置き場所・ワーカー数の上限などは settings.py
+API_V1_BASE = os.environ.get("TWITTER_API_V1_BASE", "https://api.twitter.com/1.1")
+API_V2_BASE = os.environ.get("TWITTER_API_V2_BASE", "https://api.x.com/2")
+
+# 削除前の存在確認（v2 の /tweets?ids= で一括検索。削除とは別の読み取り枠を使う）
+PREFLIGHT_BATCH = 100          # 1回の問い合わせで確認するID数（API の上限）
+LOOKUP_INTERVAL_SEC = 1.0      # ヘッダが返ってこない場合の問い合わせ間隔
+STATUS_GONE = "SKIP(gone)"     # 存在確認・削除で見つからなかった（削除済み・元ツイートが消えたRTなど）
+
+# destroy の結果の分類
+OUTCOME_DONE = "done"        # 削除できた
+OUTCOME_GONE = "gone"        # もう無かった（404）
+OUTCOME_RETRY = "retryable"  # 一時的な失敗（429・5xx・タイムアウト・接続エラー）→ 時間をおいて送り直す
+OUTCOME_FATAL = "fatal"      # 認証・権限エラー（401/403）→ ジョブを止める（未処理のまま残るので再開できる）
+OUTCOME_FAILED = "failed"    # それ以外の失敗・送り直しの上限に達した → NG として記録
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+FATAL_STATUSES = (401, 403)
+
+# 送り直し（指数バックオフ。待っている間も新しいIDの削除は続ける）
+RETRY_BASE_SEC = 5.0    # 1回目の送り直しまでの待ち
+RETRY_MAX_SEC = 300.0   # 待ちの上限
+MAX_RETRIES = 5         # これだけ送り直してもだめなら NG
+
+# ログの書き出し（ファイルは開いたまま、行をまとめて書く）
+LOG_FLUSH_LINES = 100   # この行数たまったら書き出す
+LOG_FLUSH_SEC = 1.0     # 前回の書き出しからこの秒数たっていたら書き出す
+LOG_FSYNC_LINES = 1000  # この行数ごとに fsync（チェックポイント）
+
+# 全ジョブで共有する削除ワーカー（ジョブごとの同時実行数は workers で別に制限）
+WORKER_POOL_SIZE = 16
+MAX_FINISHED_JOBS = 20   # メモリに残しておく終了済みジョブの数
+
+# 計測（/metrics）。待ち時間は1件を送るまでに待った合計を理由ごとに記録する
+DELETION_WORK_SECONDS = metrics.histogram(
+    "tweet_tools_deletion_work_seconds", "1件の削除処理（リクエスト・ログ・進捗記録）の時間")
+DELETION_WAIT_SECONDS = metrics.histogram(
+    "tweet_tools_deletion_wait_seconds", "1件を送るまでの待ち時間（slot=空きワーカー / rate=送信枠 / pause=一時停止）",
+    ("reason",), metrics.SLEEP_BUCKETS)
+STATE_LOCK_WAIT_SECONDS = metrics.histogram(
+    "tweet_tools_state_lock_wait_seconds", "ジョブの状態ロックの取得待ち時間", (), metrics.LOCK_BUCKETS)
+PREFLIGHT_ITEMS = metrics.counter(
+    "tweet_tools_deletion_preflight_total", "存在確認したID数（live=削除へ / gone=スキップ / unchecked=確認できず削除へ）",
+    ("result",))
+DELETION_OUTCOMES = metrics.counter(
+    "tweet_tools_deletion_outcomes_total", "destroy の結果（done / gone / retryable / fatal / failed）", ("outcome",))
+
+# ====== ユーティリティ ======
+def make_auth(api_key: str, api_secret: str, access_token: str, access_secret: str) -> OAuth1:
+    return OAuth1(api_key, api_secret, access_token, access_secret)
+
+def make_client(api_key: str, api_secret: str, access_token: str, access_secret: str,
+                retries: int = 0) -> ApiClient:
+    """
+    認証情報1組ぶんの keep-alive クライアント（同じキーなら接続を使い回す）。
+    destroy の再試行は DeletionJob が結果を分類して後回しにするので、既定ではクライアント側では再試行しない
+    （その場で最大30秒眠ってワーカーを塞いだり、送信枠を数えずに送り直したりしないように）
+    """
+    return get_client(
+        ("oauth1", api_key, api_secret, access_token, access_secret),
+        auth=make_auth(api_key, api_secret, access_token, access_secret),
+        pool_size=MAX_WORKERS,
+        retries=retries,
+    )
+
+def verify_credentials(client: ApiClient) -> Tuple[bool, int, str, dict]:
+    url = f"{API_V1_BASE}/account/verify_credentials.json?skip_status=true&include_email=false"
+    resp = client.get(url, timeout=20)
+    if resp.status_code == 200:
+        data = resp.json()
+        return True, resp.status_code, "", data
+    return False, resp.status_code, resp.text, {}
+
+def classify_response(status_code: Optional[int]) -> str:
+    """destroy の応答ステータス（例外で応答が無ければ None）を結果の分類（OUTCOME_*）にする"""
+    if status_code == 200:
+        return OUTCOME_DONE
+    if status_code is None or status_code in RETRY_STATUSES:
+        return OUTCOME_RETRY
+    if status_code == 404:
+        return OUTCOME_GONE
+    if status_code in FATAL_STATUSES:
+        return OUTCOME_FATAL
+    return OUTCOME_FAILED
+
+def retry_delay(attempt: int) -> float:
+    """attempt 回目の送り直しまでの待ち秒数（ジッター付き指数バックオフ）"""
+    return min(RETRY_MAX_SEC, RETRY_BASE_SEC * 2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+
+# ====== ログ ======
+def open_log() -> str:
+    ts = datetime.now(JST).strftime("%Y%m%d_%H%M%S")
+    filename = f"deleted_ids_{ts}.log"
+    path = os.path.join(LOG_DIR, filename)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"# Tweet Deleter Log {ts}\n")
+        f.write("# timezone: JST(+09:00)\n")
+        f.write("# format: <response_at_iso>\t<tweet_id>\t<status>\t<posted_at_iso>\t<text(head)>\n")
+    return filename
+
+def format_log_line(tid: str, status: str, text_head: str,
+                    response_at: Optional[datetime] = None,
+                    created: int = NO_TIME) -> str:
+    head = (text_head or "").replace("\n", " ").strip()[:120]
+    now_iso = (response_at or datetime.now(JST)).isoformat(timespec="seconds")
+    posted = format_posted_at(created) or ""  # 投稿時刻の ISO 整形はここ（ログに書くとき）だけ
+    return f"{now_iso}\t{tid}\t{status}\t{posted}\t{head}\n"
+
+class LogWriter:
+    """
+    実行中のログファイルを開いたまま持ち、行をまとめて書き出す。
+    flush_lines 行たまるか flush_sec 秒たったら書き出し、fsync_lines 行ごとに fsync する。
+    待機・一時停止・キャンセル・終了時は呼び出し側が flush() / close() する。
+    """
+
+    def __init__(self, filename: str, flush_lines: int = LOG_FLUSH_LINES,
+                 flush_sec: float = LOG_FLUSH_SEC, fsync_lines: int = LOG_FSYNC_LINES):
+        self.filename = filename
+        self.flush_lines = flush_lines
+        self.flush_sec = flush_sec
+        self.fsync_lines = fsync_lines
+        self._lock = threading.Lock()
+        self._f = open(os.path.join(LOG_DIR, filename), "a", encoding="utf-8")
+        self._buf: List[str] = []
+        self._last_flush = time.time()
+        self._unsynced = 0
+
+    def write(self, tid: str, status: str, text_head: str,
+              response_at: Optional[datetime] = None,
+              created: int = NO_TIME):
+        line = format_log_line(tid, status, text_head, response_at, created)
+        with self._lock:
+            self._buf.append(line)
+            if len(self._buf) >= self.flush_lines or time.time() - self._last_flush >= self.flush_sec:
+                self._flush_locked(fsync=False)
+
+    def _flush_locked(self, fsync: bool):
+        if self._buf:
+            self._f.write("".join(self._buf))
+            self._unsynced += len(self._buf)
+            self._buf.clear()
+        self._f.flush()
+        self._last_flush = time.time()
+        if self._unsynced and (fsync or self._unsynced >= self.fsync_lines):
+            os.fsync(self._f.fileno())
+            self._unsynced = 0
+
+    def flush(self, fsync: bool = False):
+        with self._lock:
+            if not self._f.closed:
+                self._flush_locked(fsync)
+
+    def checkpoint(self):
+        """書き出してディスクまで同期する"""
+        self.flush(fsync=True)
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._flush_locked(fsync=True)
+                self._f.close()
+
+# ====== 補助：ETA表示用 ======
+def seconds_to_hms(sec: int) -> str:
+    h = sec // 3600
+    m = (sec % 3600) // 60
+    s = sec % 60
+    if h > 0:
+        return f"{h}時間{m}分{s}秒"
+    if m > 0:
+        return f"{m}分{s}秒"
+    return f"{s}秒"
+
+# ====== ジョブ（1回の削除実行。状態・ログ・一時停止/キャンセルはジョブごと） ======
+def idle_state() -> Dict[str, Any]:
+    return {
+        "running": False,
+        "total": 0,
+        "done": 0,
+        "ok": 0,
+        "ng": 0,
+        "skipped": 0,  # もう無かった件数（存在確認で見つからなかった・削除が 404）
+        "retrying": 0,  # 送り直し待ちの件数
+        "retries": 0,  # 一時的な失敗で送り直しに回した回数（累計）
+        "fatal": 0,  # 認証・権限エラーの応答数（1件でもあればジョブを止める）
+        "current_id": None,
+        "current_text": "",
+        "phase": "idle",  # idle / processing / waiting / paused / canceled / finished / error
+        "wait_until": 0.0,  # 待機終了予定時刻（epoch秒）
+        "started_at": None,
+        "log_filename": None,
+        "message": "",
+        "workers": DEFAULT_WORKERS,
+        "inflight": 0,  # 応答待ちの削除リクエスト数
+        "preflight": False,  # 削除前に存在確認するか
+        "job_id": None,
+    }
+
+def build_status(s: Mapping[str, Any], sched: Optional[RateLimitScheduler] = None) -> Dict[str, Any]:
+    """/status・/events で返す進捗（ジョブの状態 ＋ 進捗率・ETA などの算出値）"""
+    # 待機残り秒
+    wait_remaining = -1
+    if s.get("phase") == "waiting":
+        wait_remaining = max(0, int(s.get("wait_until", 0) - time.time()))
+    if s.get("phase") == "paused":
+        wait_remaining = -1
+
+    total = int(s.get("total") or 0)
+    done = int(s.get("done") or 0)
+
+    # 進捗％
+    pct = int((done / total) * 100) if total > 0 else 0
+
+    # ETA（スケジューラの残り枠・reset・実測応答時間から見積もる）
+    eta_seconds = 0
+    if sched is not None and total > 0 and done < total and s.get("running"):
+        eta_seconds = sched.eta_seconds(total - done, concurrency=int(s.get("workers") or 1))
+
+    return {
+        "job_id": s.get("job_id"),
+        "running": s.get("running"),
+        "total": total,
+        "done": done,
+        "ok": s.get("ok"),
+        "ng": s.get("ng"),
+        "skipped": s.get("skipped"),
+        "retrying": s.get("retrying"),
+        # 結果の分類ごとの件数（retryable は送り直しの回数）
+        "outcomes": {OUTCOME_DONE: s.get("ok"), OUTCOME_GONE: s.get("skipped"), OUTCOME_RETRY: s.get("retries"),
+                     OUTCOME_FATAL: s.get("fatal"), OUTCOME_FAILED: s.get("ng")},
+        "current_id": s.get("current_id"),
+        "current_text": s.get("current_text"),
+        "phase": s.get("phase"),
+        "wait_remaining": wait_remaining,
+        "log_filename": s.get("log_filename"),
+        "message": s.get("message"),
+        "workers": s.get("workers"),
+        "inflight": s.get("inflight"),
+        "preflight": s.get("preflight"),
+        "pct": pct,
+        "eta_seconds": eta_seconds,
+        "eta_hms": seconds_to_hms(eta_seconds),
+    }
+
+class DeletionJob:
+    """
+    job_store に登録された1ジョブの未処理分を古い順に削除する。
+    workers 件までリクエストを同時に飛ばすが、送信タイミングはアカウント単位の
+    スケジューラが決めるので、同じアカウントのジョブが並んでもレート枠を超えることはない。
+    キャンセル時は新規送信を止め、応答待ちのリクエストを処理し終えてから終了する。
+    結果は1件ごとに job_store へ記録するので、中断しても続きから再開できる。
+    一時的な失敗は時間をおいて送り直し（その間も新しいIDは送り続ける）、認証・権限エラーならすぐ止める。
+    preflight なら削除の前に PREFLIGHT_BATCH 件ずつ存在を確認し、見つからないものは destroy を送らない。
+    """
+
+    def __init__(self, job_id: str, client: ApiClient, sched: RateLimitScheduler,
+                 workers: int = DEFAULT_WORKERS, on_change=None,
+                 lookup_sched: Optional[RateLimitScheduler] = None, preflight: bool = False):
+        self.job_id = job_id
+        self.client = client
+        self.scheduler = sched
+        self.lookup_scheduler = lookup_sched or RateLimitScheduler(fallback_interval=LOOKUP_INTERVAL_SEC)
+        self.preflight = preflight
+        self.workers = max(1, min(MAX_WORKERS, int(workers)))
+        self.pause_event = threading.Event()   # set中はポーズ状態
+        self.cancel_event = threading.Event()  # setでキャンセル
+        # 送信ループを起こす条件変数（操作・応答の到着で notify。待つ側はポーリングしない）
+        self._wake = threading.Condition()
+        self._lock = metrics.TimedLock(STATE_LOCK_WAIT_SECONDS)  # 書き込み同士の順序付けだけに使う
+        self._on_change = on_change
+        state = idle_state()
+        state.update({"job_id": job_id, "workers": self.workers, "running": True, "phase": "processing",
+                      "preflight": preflight})
+        # 状態は読み取り専用のスナップショットで、更新のたびに丸ごと差し替える（読む側はロック不要）
+        self._state: Mapping[str, Any] = MappingProxyType(state)
+        # (もとにしたスナップショット, 秒, build_status の結果, その JSON)
+        self._status_cache: Tuple[Optional[Mapping[str, Any]], int, Dict[str, Any], str] = (None, 0, {}, "")
+
+    # ---- 状態 ----
+    def _changed(self):
+        if self._on_change:
+            self._on_change()
+
+    def apply(self, changes: Optional[Dict[str, Any]] = None, **deltas: int) -> Mapping[str, Any]:
+        """
+        changes の値を設定し、deltas の分だけカウンタを増減した新しいスナップショットに差し替える。
+        1件ぶんの変更はまとめて1回で渡す（途中の状態が読まれないように）。変更前のスナップショットを返す
+        """
+        with self._lock:
+            before = self._state
+            if changes and all(before.get(k) == v for k, v in changes.items()):
+                changes = None
+            if not changes and not any(deltas.values()):
+                return before
+            state = dict(before)
+            if changes:
+                state.update(changes)
+            for k, d in deltas.items():
+                state[k] += d
+            self._state = MappingProxyType(state)
+        self._changed()
+        return before
+
+    def update(self, **changes) -> Mapping[str, Any]:
+        """状態を更新し、値が変わっていれば購読者に知らせる。変更前のスナップショットを返す"""
+        return self.apply(changes)
+
+    def incr(self, **deltas: int):
+        """カウンタを増減して購読者に知らせる"""
+        self.apply(None, **deltas)
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """今の状態（読み取り専用。コピーせずにそのまま返す）"""
+        return self._state
+
+    def _cached_status(self) -> Tuple[Optional[Mapping[str, Any]], int, Dict[str, Any], str]:
+        # スナップショットが変わったときか、待機残り秒・ETA の表示が変わる1秒ごとにだけ作り直す
+        state, now = self._state, int(time.time())
+        cache = self._status_cache
+        if cache[0] is not state or cache[1] != now:
+            st = build_status(state, self.scheduler)
+            cache = self._status_cache = (state, now, st, json.dumps(st, ensure_ascii=False))
+        return cache
+
+    def status(self) -> Dict[str, Any]:
+        """/status・/events で返す進捗（キャッシュを共有しているので書き換えないこと）"""
+        return self._cached_status()[2]
+
+    def status_json(self) -> str:
+        return self._cached_status()[3]
+
+    @property
+    def running(self) -> bool:
+        return bool(self._state["running"])
+
+    def control(self, cmd: str):
+        if cmd == "pause":
+            self.pause_event.set()
+        elif cmd == "resume":
+            self.pause_event.clear()
+        elif cmd == "cancel":
+            self.cancel_event.set()
+        else:
+            return
+        self._notify()
+
+    def _notify(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    # ---- 実処理 ----
+    def _destroy_one(self, log: LogWriter, item: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        1件削除してログに書き、(結果の分類, ログの状態) を返す（ワーカースレッドで実行）。
+        送り直す分と認証エラーは job_store に記録しない（未処理のまま残り、再開時にもう一度送る）
+        """
+        tid = item["id"]
+        ttext = item.get("text", "")
+        created = item.get("created", NO_TIME)  # 投稿時刻（UNIX秒。ログに書くときに JST の ISO にする）
+
+        url = f"{API_V1_BASE}/statuses/destroy/{tid}.json"
+        try:
+            resp = self.client.post(url, timeout=20)
+        except requests.RequestException as e:
+            # タイムアウト・接続エラーは送り直す（それ以外の例外はジョブを止める）
+            self.scheduler.release()
+            code: Optional[int] = None
+            label = "timeout" if isinstance(e, requests.Timeout) else type(e).__name__
+        except Exception:
+            self.scheduler.release()
+            raise
+        else:
+            self.scheduler.update(resp)
+            code = resp.status_code
+            label = str(code)
+        response_at = datetime.now(JST)  # 追加: レスポンス返却時刻（JST）
+
+        outcome = classify_response(code)
+        if outcome == OUTCOME_RETRY and item.get("attempt", 0) >= MAX_RETRIES:
+            outcome = OUTCOME_FAILED
+        if outcome == OUTCOME_DONE:
+            status = "OK"
+        elif outcome == OUTCOME_GONE:
+            status = STATUS_GONE
+        elif outcome == OUTCOME_RETRY:
+            status = f"RETRY({label})"
+        else:
+            status = f"NG({label})"
+        log.write(tid, status, ttext, response_at, created)
+        if outcome in (OUTCOME_DONE, OUTCOME_GONE):
+            deleted_index.add(tid)
+        if outcome in (OUTCOME_DONE, OUTCOME_GONE, OUTCOME_FAILED):
+            job_store.record(self.job_id, item["seq"], status)
+        DELETION_OUTCOMES.inc(outcome=outcome)
+        return outcome, label
+
+    def _wait_until(self, send_at: float, log: LogWriter):
+        """
+        「待機中」にする。待つ間に行がバッファや未コミットの進捗に残らないよう、ログと job_store を書き出しておく
+        （どちらも次の1件が来たときにしか時間での書き出しを判定しないので、長い待ちの前に済ませる）
+        """
+        self.update(phase="waiting", wait_until=send_at)
+        log.flush()
+        job_store.flush()
+
+    def _lookup_missing(self, ids: List[str], stopped, log: LogWriter) -> Optional[Set[str]]:
+        """
+        v2 の /tweets?ids= で ids（最大 PREFLIGHT_BATCH 件）を調べ、「見つからない」と返ってきたIDを返す。
+        確認できなかった（エラー・キャンセル）ときは None。
+        """
+        sched = self.lookup_scheduler
+        while not stopped():
+            send_at = sched.try_acquire()
+            if send_at:
+                self._wait_until(send_at, log)
+                with self._wake:
+                    self._wake.wait_for(stopped, timeout=max(0.0, send_at - time.time()))
+                continue
+            try:
+                resp = self.client.get(f"{API_V2_BASE}/tweets", params={"ids": ",".join(ids)}, timeout=20)
+            except Exception:
+                sched.release()
+                return None
+            sched.update(resp)
+            if resp.status_code in (429, 503):
+                continue  # スケジューラが reset かバックオフの分だけ待たせる
+            if resp.status_code in (401, 403):
+                # v2 を使えないキー（プラン・権限）→ 以降は確認せずに削除する
+                self.preflight = False
+                self.update(preflight=False, message=f"存在確認が使えなかったので（{resp.status_code}）、確認せずに削除するよ")
+                return None
+            if resp.status_code != 200:
+                return None
+            try:
+                errors = resp.json().get("errors") or []
+            except ValueError:
+                return None
+            # 見つからないと明示されたものだけ（権限エラーなどで返ってこなかったIDは削除に回す）
+            return {str(e.get("resource_id") or e.get("value")) for e in errors
+                    if e.get("title") == "Not Found Error" or str(e.get("type", "")).endswith("/resource-not-found")}
+        return None
+
+    def _preflight(self, tweets: Iterable[Dict[str, Any]], log: LogWriter, stopped) -> Iterator[Dict[str, Any]]:
+        """tweets を PREFLIGHT_BATCH 件ずつ存在確認し、見つからないものは SKIP(gone) として記録して残りだけを返す"""
+        it = iter(tweets)
+        while True:
+            batch = list(itertools.islice(it, PREFLIGHT_BATCH))
+            if not batch:
+                return
+            missing = self._lookup_missing([item["id"] for item in batch], stopped, log) if self.preflight else None
+            if missing is None:
+                PREFLIGHT_ITEMS.inc(len(batch), result="unchecked")
+                yield from batch
+                continue
+            for item in batch:
+                if item["id"] not in missing:
+                    PREFLIGHT_ITEMS.inc(result="live")
+                    yield item
+                    continue
+                PREFLIGHT_ITEMS.inc(result="gone")
+                log.write(item["id"], STATUS_GONE, item.get("text", ""), datetime.now(JST), item.get("created", NO_TIME))
+                job_store.record(self.job_id, item["seq"], STATUS_GONE)
+                deleted_index.add(item["id"])
+                self.incr(skipped=1, done=1)
+
+    def run(self, tweets: TweetQueue, executor: ThreadPoolExecutor):
+        """tweets（job_store.pending_items の TweetQueue）を executor のワーカーで削除する"""
+        job_id, sched = self.job_id, self.scheduler
+        progress = job_store.progress(job_id)
+        log_name = progress["log_filename"]
+        if not log_name:
+            log_name = open_log()
+            job_store.set_log_filename(job_id, log_name)
+        job_store.set_status(job_id, "running")
+        self.update(
+            running=True, phase="processing", message="",
+            total=progress["total"], done=progress["done"],
+            ok=progress["ok"], ng=progress["ng"], skipped=progress["skipped"],
+            started_at=time.time(), log_filename=log_name,
+        )
+        log = LogWriter(log_name)
+
+        wake = self._wake
+        free = self.workers                # 空いているワーカー（同時に応答待ちにできる残り件数。wake の中で読み書き）
+        responses = 0                      # 返ってきた応答の数（送信枠の待ちを起こす目印）
+        failures: List[BaseException] = []  # ワーカーで起きた例外（最初の1件で中断）
+        fatal: List[str] = []               # 認証・権限エラーのステータス（最初の1件で中断）
+        abort = threading.Event()
+        # 送り直し待ち: (送ってよい時刻, 通し番号, item) のヒープ（wake の中で読み書き）
+        retries: List[Tuple[float, int, Dict[str, Any]]] = []
+        retry_seq = itertools.count()
+
+        def work(item: Dict[str, Any]):
+            nonlocal free, responses
+            deltas = {"inflight": -1}
+            try:
+                with DELETION_WORK_SECONDS.time():
+                    outcome, label = self._destroy_one(log, item)
+                if outcome == OUTCOME_DONE:
+                    deltas.update(ok=1, done=1)
+                elif outcome == OUTCOME_GONE:
+                    deltas.update(skipped=1, done=1)
+                elif outcome == OUTCOME_FAILED:
+                    deltas.update(ng=1, done=1)
+                elif outcome == OUTCOME_RETRY:
+                    deltas.update(retries=1, retrying=1)
+                    item["attempt"] = item.get("attempt", 0) + 1
+                    with wake:
+                        heapq.heappush(retries, (time.time() + retry_delay(item["attempt"]), next(retry_seq), item))
+                else:
+                    deltas.update(fatal=1)
+                    fatal.append(label)
+                    abort.set()
+            except BaseException as e:
+                failures.append(e)
+                abort.set()
+            finally:
+                # 結果の反映は1件につき1回の差し替え
+                self.incr(**deltas)
+                with wake:
+                    free += 1
+                    responses += 1
+                    wake.notify_all()  # 空きワーカー待ち・応答待ちの完了待ち・送信枠の再確認を起こす
+
+        def stopped() -> bool:
+            return self.cancel_event.is_set() or abort.is_set()
+
+        def drain():
+            # 応答待ちが無くなるまで待つ
+            with wake:
+                wake.wait_for(lambda: free == self.workers)
+
+        def resumed() -> bool:
+            return stopped() or not self.pause_event.is_set()
+
+        def pause():
+            # 一時停止に入ったらディスクまで同期し、応答待ちの分が返ってきたらもう一度同期して、再開・キャンセルまで眠る
+            self.update(phase="paused")
+            log.checkpoint()
+            if self._state["inflight"]:
+                with wake:
+                    wake.wait_for(lambda: resumed() or not self._state["inflight"])
+                log.checkpoint()
+            with wake:
+                wake.wait_for(resumed)
+
+        fresh: Optional[Iterator[Dict[str, Any]]] = iter(self._preflight(tweets, log, stopped) if self.preflight else tweets)
+
+        def next_item() -> Optional[Dict[str, Any]]:
+            # 送ってよい時刻を過ぎた送り直しを優先し、無ければ新しいIDを出す。
+            # 新しいIDが尽きたら、送り直し待ち・応答待ちが無くなるまで待つ（応答が新しい送り直しを積むことがある）
+            nonlocal fresh
+            while not stopped():
+                with wake:
+                    if retries and retries[0][0] <= time.time():
+                        item = heapq.heappop(retries)[2]
+                        self.incr(retrying=-1)
+                        return item
+                if fresh is not None:
+                    item = next(fresh, None)
+                    if item is not None:
+                        return item
+                    fresh = None
+                with wake:
+                    if not retries and free == self.workers:
+                        return None
+                    seen = responses
+                    due = retries[0][0] if retries else None
+                if due is not None:
+                    self._wait_until(due, log)
+                with wake:
+                    wake.wait_for(lambda: stopped() or responses != seen,
+                                  timeout=None if due is None else max(0.0, due - time.time()))
+            return None
+
+        try:
+            while True:
+                item = next_item()
+                if item is None:
+                    break
+                # 空きワーカー待ち
+                t0 = time.perf_counter()
+                with wake:
+                    wake.wait_for(lambda: stopped() or free > 0)
+                    if not stopped():
+                        free -= 1
+                DELETION_WAIT_SECONDS.observe(time.perf_counter() - t0, reason="slot")
+                if stopped():
+                    break
+
+                # 送信枠を確保。枠が無ければ送れる時刻まで待機（リアルタイム表示）
+                acquired = False
+                paused_sec = rate_sec = 0.0
+                while not stopped():
+                    if self.pause_event.is_set():
+                        t0 = time.perf_counter()
+                        pause()
+                        paused_sec += time.perf_counter() - t0
+                        continue
+                    seen = responses
+                    send_at = sched.try_acquire()
+                    if not send_at:
+                        acquired = True
+                        break
+                    # 送れる見込み時刻まで眠る。応答が届いたら（ヘッダで見込みが早まることがある）・操作されたら起きて確認し直す
+                    t0 = time.perf_counter()
+                    self._wait_until(send_at, log)
+                    with wake:
+                        wake.wait_for(lambda: stopped() or self.pause_event.is_set() or responses != seen,
+                                      timeout=max(0.0, send_at - time.time()))
+                    rate_sec += time.perf_counter() - t0
+                DELETION_WAIT_SECONDS.observe(rate_sec, reason="rate")
+                if paused_sec:
+                    DELETION_WAIT_SECONDS.observe(paused_sec, reason="pause")
+
+                if stopped():
+                    if acquired:
+                        sched.release()
+                    with wake:
+                        free += 1
+                    break
+
+                # 表示用に更新
+                self.apply({"phase": "processing", "current_id": item["id"], "current_text": item.get("text", "")},
+                           inflight=1)
+                try:
+                    executor.submit(work, item)
+                except BaseException:
+                    self.incr(inflight=-1)
+                    with wake:
+                        free += 1
+                    raise
+
+            # 応答待ちのリクエストを処理し切ってから終了
+            drain()
+
+            # 終了
+            if failures:
+                e = failures[0]
+                self.update(phase="error", message=f"{type(e).__name__}: {e}")
+            elif fatal:
+                self.update(phase="error", message=f"認証・権限エラー（{fatal[0]}）で止めたよ。キーの権限を確認してから再開してね")
+            elif self.cancel_event.is_set():
+                self.update(phase="canceled")
+            elif self.snapshot()["phase"] not in ("canceled", "error"):
+                self.update(phase="finished")
+        except Exception as e:
+            self.update(phase="error", message=f"{type(e).__name__}: {e}")
+        finally:
+            drain()
+            log.close()
+            # 記録を済ませてから終了を知らせる（終了を待っている側がすぐ読めるように）
+            snap = self.snapshot()
+            job_store.set_status(job_id, snap["phase"], snap["message"])
+            self.update(running=False)
+
+class JobManager:
+    """
+    実行中・最近終了したジョブの一覧。
+    ワーカープールは全ジョブで1つ、レート制限のスケジューラはアカウントごとに1つ持つ。
+    """
+
+    def __init__(self, pool_size: int = WORKER_POOL_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="destroy")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, DeletionJob]" = OrderedDict()
+        self._schedulers: Dict[str, RateLimitScheduler] = {}
+        self._lookup_schedulers: Dict[str, RateLimitScheduler] = {}  # 存在確認（v2 の /tweets）用
+        self._starting: Set[str] = set()  # 登録済みでまだ run が始まっていないジョブ（同じジョブを二重に始めない）
+        self._changed = threading.Condition()  # どれかのジョブの状態が変わったら通知（/events 用）
+        self._seq = 0
+
+    # ---- 変更通知 ----
+    def notify(self):
+        with self._changed:
+            self._seq += 1
+            self._changed.notify_all()
+
+    def wait_change(self, seen: int, timeout: float) -> int:
+        """seen 以降に変更があるか timeout 秒たつまで待ち、最新の通し番号を返す"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._seq != seen, timeout=timeout)
+            return self._seq
+
+    # ---- ジョブ ----
+    def scheduler_for(self, account_key: str) -> RateLimitScheduler:
+        with self._lock:
+            sched = self._schedulers.get(account_key)
+            if sched is None:
+                sched = self._schedulers[account_key] = RateLimitScheduler(fallback_interval=INTERVAL_SEC)
+            return sched
+
+    def lookup_scheduler_for(self, account_key: str) -> RateLimitScheduler:
+        with self._lock:
+            sched = self._lookup_schedulers.get(account_key)
+            if sched is None:
+                sched = self._lookup_schedulers[account_key] = RateLimitScheduler(fallback_interval=LOOKUP_INTERVAL_SEC)
+            return sched
+
+    def start(self, client: ApiClient, account_key: str, job_id: str, workers: int,
+              preflight: bool = False) -> DeletionJob:
+        """ジョブの未処理分をバックグラウンドで削除し始める（実行中・開始処理中なら何もしない）"""
+        sched, lookup_sched = self.scheduler_for(account_key), self.lookup_scheduler_for(account_key)
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if existing is not None and (existing.running or job_id in self._starting):
+                return existing
+            # 未処理分の読み込み（遅い）の前に登録しておき、同時に来た start にはこのジョブを返す
+            job = DeletionJob(job_id, client, sched, workers, on_change=self.notify,
+                              lookup_sched=lookup_sched, preflight=preflight)
+            self._starting.add(job_id)
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            finished = [k for k, j in self._jobs.items() if not j.running and k not in self._starting]
+            for k in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[k]
+        try:
+            tweets = job_store.pending_items(job_id)
+            t = threading.Thread(target=job.run, args=(tweets, self.executor), daemon=True)
+            t.start()
+        except BaseException:
+            with self._lock:
+                if self._jobs.get(job_id) is job:
+                    del self._jobs[job_id]
+            raise
+        finally:
+            with self._lock:
+                self._starting.discard(job_id)
+        self.notify()
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[DeletionJob]:
+        """job_id のジョブ。None なら一番新しいジョブ"""
+        with self._lock:
+            if job_id is None:
+                return next(reversed(self._jobs.values()), None)
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[DeletionJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def schedulers(self) -> List[Tuple[str, str, RateLimitScheduler]]:
+        """(アカウント, 用途 destroy / lookup, スケジューラ)"""
+        with self._lock:
+            return ([(k, "destroy", s) for k, s in self._schedulers.items()]
+                    + [(k, "lookup", s) for k, s in self._lookup_schedulers.items()])
+
+# ジョブを動かすプロセスだけが open_engine() で作る（画面側のプロセスでは作らない）
+job_store: Optional[JobStore] = None           # 削除ジョブの進捗（再起動しても途中から再開できるよう SQLite に記録）
+deleted_index: Optional[DeletedIndex] = None   # 過去のログで削除済み(OK)・存在しない(SKIP(gone))と分かったIDの索引
+jobs: Optional[JobManager] = None
+_engine_lock = threading.Lock()
+
+def open_engine() -> Tuple[JobStore, JobManager]:
+    """
+    進捗DB・削除済みIDの索引・ジョブ管理を作る。ジョブを実際に動かすプロセス（worker.serve・cli.py）が最初に呼ぶ。
+    読み込んだだけでは DB を開いたり索引を読んだりしない。2回目以降は同じものを返す
+    """
+    global job_store, deleted_index, jobs
+    with _engine_lock:
+        if jobs is None:
+            job_store = JobStore(os.path.join(DATA_DIR, "jobs.sqlite3"))
+            deleted_index = DeletedIndex(LOG_DIR)
+            jobs = JobManager()
+            metrics.REGISTRY.add_collector(collect_metrics)
+        return job_store, jobs
+
+def collect_metrics() -> List[metrics.Family]:
+    """/metrics 用: 実行中ジョブのキューの長さと、アカウントごとのレート枠の残り"""
+    queued, inflight = [], []
+    for job in jobs.list():
+        s = job.snapshot()
+        if not s["running"]:
+            continue
+        labels = {"job_id": job.job_id}
+        queued.append((labels, max(0, s["total"] - s["done"] - s["inflight"])))
+        inflight.append((labels, s["inflight"]))
+    headroom: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for account_key, kind, sched in jobs.schedulers():
+        labels = {"account": account_key[:12], "kind": kind}  # 認証情報のハッシュの先頭だけ
+        for k, v in sched.headroom().items():
+            headroom.setdefault(k, []).append((labels, v))
+    families = [
+        ("tweet_tools_deletion_queue_depth", "gauge", "未送信の削除件数", queued),
+        ("tweet_tools_deletion_inflight", "gauge", "応答待ちの削除リクエスト数", inflight),
+    ]
+    for k, samples in headroom.items():
+        families.append((f"tweet_tools_ratelimit_{k}", "gauge", f"削除・存在確認の送信枠（RateLimitScheduler.headroom の {k}）", samples))
+    return families
+
+def submit_job(client: ApiClient, account_key: str, tweets: TweetQueue,
+               workers: int = DEFAULT_WORKERS, preflight: bool = False) -> Tuple[Optional[DeletionJob], bool, int]:
+    """
+    tweets（ID昇順）を削除するジョブを開始する。
+    同じ内容で中断したジョブがあればそれを続きから再開し、無ければ過去のログで削除済みのIDを除いて新しく作る。
+    preflight なら削除の前に存在確認し、もう無いツイートには destroy を送らない。
+    戻り値: (開始したジョブ（全部削除済みなら None）, 中断ジョブの再開か, スキップした件数)
+    """
+    fingerprint = fingerprint_ids(str(tid) for tid in tweets.ids)
+    resumable = job_store.find_resumable(account_key, fingerprint)
+    if resumable:
+        return jobs.start(client, account_key, resumable["job_id"], workers, preflight), True, 0
+
+    deleted_index.refresh()
+    positions, skipped = deleted_index.new_positions(tweets.ids)
+    if skipped:
+        tweets = tweets.select(positions)
+    del positions
+    if not tweets:
+        return None, False, skipped
+
+    job_id = job_store.create_job(account_key, tweets, fingerprint=fingerprint)
+    del tweets
+    return jobs.start(client, account_key, job_id, workers, preflight), False, skipped
@@ -1,13 +1,11 @@
-import io
-import json
-import time
-from typing import Dict, Any, List, Optional
+import itertools
 
-from flask import Flask, request, render_template_string, send_file
-import requests
+from flask import Flask, Response, request, render_template_string
+
+import metrics
+from fetcher import TimelineCache, exclude_param_for, get_user_by_username, iter_timeline, iter_tweets_js
 
 app = Flask(__name__)
-API_BASE = "https://api.x.com/2"
 
 HTML = """
 <!doctype html>
@@ -66,6 +64,16 @@ HTML = """
       </div>
     </div>
 
+    <div class="row">
+      <div>
+        <label>前回の取得結果</label>
+        <select name="use_cache">
+          <option value="true" {% if use_cache %}selected{% endif %}>使う（新しい分だけ取得）</option>
+          <option value="false" {% if not use_cache %}selected{% endif %}>使わない（全部取り直す）</option>
+        </select>
+      </div>
+    </div>
+
     <div class="btns">
       <button type="submit" name="action" value="check">接続確認</button>
       <button type="submit" name="action" value="fetch">取得してダウンロード</button>
@@ -75,115 +83,21 @@ HTML = """
 </html>
 """
 
-# ---- helpers ----
-def auth_headers(bearer: str) -> Dict[str, str]:
-    return {"Authorization": f"Bearer {bearer}"}
-
-def sleep_for_reset(r: requests.Response):
-    # レートヘッダに従って自動待機
-    try:
-        rem = int(r.headers.get("x-rate-limit-remaining", "1"))
-        reset = int(r.headers.get("x-rate-limit-reset", "0"))
-    except ValueError:
-        rem, reset = 1, 0
-    if r.status_code == 429 or rem <= 0:
-        wait = max(0, reset - int(time.time())) + 2
-        time.sleep(wait)
-
-# ---- API ----
-def get_user_by_username(bearer: str, username: str) -> Dict[str, Any]:
-    url = f"{API_BASE}/users/by/username/{username}"
-    r = requests.get(url, headers=auth_headers(bearer), timeout=20)
-    if r.status_code != 200:
-        raise RuntimeError(f"users/by/username {r.status_code}: {r.text[:300]}")
-    return r.json()["data"]
-
-def fetch_user_tweets_v2(
-    bearer: str, user_id: str, total_count: int,
-    include_rts: bool, exclude_replies: bool
-) -> List[Dict[str, Any]]:
-    url = f"{API_BASE}/users/{user_id}/tweets"
-    items: List[Dict[str, Any]] = []
-    next_token: Optional[str] = None
-
-    excludes = []
-    if not include_rts: excludes.append("retweets")
-    if exclude_replies: excludes.append("replies")
-    exclude_param = ",".join(excludes) if excludes else None
-
-    while len(items) < total_count:
-        params = {
-            "max_results": 100,
-            "tweet.fields": "created_at,lang,public_metrics,entities,source",
-        }
-        if exclude_param: params["exclude"] = exclude_param
-        if next_token: params["pagination_token"] = next_token
-
-        r = requests.get(url, headers=auth_headers(bearer), params=params, timeout=30)
-        if r.status_code in (429, 503):
-            sleep_for_reset(r); continue
-        if r.status_code != 200:
-            raise RuntimeError(f"/tweets {r.status_code}: {r.text[:300]}")
-
-        data = r.json()
-        batch = data.get("data", [])
-        if not batch: break
-        items.extend(batch)
-
-        next_token = data.get("meta", {}).get("next_token")
-        time.sleep(1.0); sleep_for_reset(r)
-        if not next_token: break
-
-    return items[:total_count]
-
-# ---- mapping to EXACT format the deleter expects ----
-def to_archive_items_v2(statuses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    必須： item["tweet"]["id_str"] を必ず入れる。
-    互換性UP： full_text と text の両方に同値を入れる。
-    ※ 削除ツールの parse は id_str をキーに見てるよ。
-    """
-    out: List[Dict[str, Any]] = []
-    for s in statuses:
-        tid = str(s.get("id"))
-        text = s.get("text") or ""
-        tweet_obj = {
-            "id_str": tid,          # ★必須（削除側が参照）
-            "id": tid,              # 互換用（あってもOK）
-            "full_text": text,      # 互換用（優先で読まれる場合あり）
-            "text": text,           # 互換用（保険）
-            # 以下は削除には不要だが正規っぽくなる（任意）
-            "created_at": s.get("created_at"),
-            "lang": s.get("lang"),
-            "source": s.get("source", ""),
-            "retweet_count": str((s.get("public_metrics") or {}).get("retweet_count", 0)),
-            "favorite_count": str((s.get("public_metrics") or {}).get("like_count", 0)),
-            "entities": s.get("entities", {}) or {},
-        }
-        out.append({"tweet": tweet_obj})
-    return out
-
-def to_tweets_js(part0: List[Dict[str, Any]]) -> bytes:
-    buf = io.StringIO()
-    buf.write("window.YTD.tweets.part0 = ")
-    buf.write(json.dumps(part0, ensure_ascii=False))
-    buf.write(";\n")
-    return buf.getvalue().encode("utf-8")
-
 # ---- Flask ----
 @app.route("/", methods=["GET", "POST"])
 def index():
     ctx = {"message": None, "bearer": "", "username": "", "total_count": 200,
-           "include_rts": True, "exclude_replies": False}
+           "include_rts": True, "exclude_replies": False, "use_cache": True}
     if request.method == "POST":
         bearer = request.form.get("bearer", "").strip()
         username = request.form.get("username", "").strip()
         total_count = int(request.form.get("total_count") or 200)
         include_rts = request.form.get("include_rts", "true") == "true"
         exclude_replies = request.form.get("exclude_replies", "false") == "true"
+        use_cache = request.form.get("use_cache", "true") == "true"
         action = request.form.get("action")
         ctx.update({"bearer": bearer, "username": username, "total_count": total_count,
-                    "include_rts": include_rts, "exclude_replies": exclude_replies})
+                    "include_rts": include_rts, "exclude_replies": exclude_replies, "use_cache": use_cache})
 
         if not bearer or not username:
             ctx["message"] = "Bearer Token と ユーザー名は必須だよ！"
@@ -197,30 +111,37 @@ def index():
 
         if action == "check":
             ctx["message"] = f"OK！ @{user['username']}（{user['name']}）の取得ができるよ。"
+            cache = TimelineCache(user["id"], exclude_param_for(include_rts, exclude_replies))
+            if cache.load():
+                ctx["message"] += f"\n（前回の取得結果 {cache.meta['count']}件 が保存してあるよ）"
             return render_template_string(HTML, **ctx)
 
         if action == "fetch":
+            statuses = iter_timeline(
+                bearer=bearer, user=user, total_count=total_count,
+                include_rts=include_rts, exclude_replies=exclude_replies, use_cache=use_cache,
+            )
             try:
-                statuses = fetch_user_tweets_v2(
-                    bearer=bearer, user_id=user["id"], total_count=total_count,
-                    include_rts=include_rts, exclude_replies=exclude_replies
-                )
-                # 削除ツールと相性の良い「古い順（ID昇順）」に整列
-                statuses.sort(key=lambda x: int(x["id"]))
-
-                part0 = to_archive_items_v2(statuses)
-                js_bytes = to_tweets_js(part0)
-                return send_file(
-                    io.BytesIO(js_bytes),
-                    mimetype="application/javascript; charset=utf-8",
-                    as_attachment=True,
-                    download_name="tweets.js"
-                )
+                # 最初の1件までは先に取る（認証エラーなどはダウンロードではなく画面に出したい）
+                first = next(statuses, None)
             except Exception as e:
-                ctx["message"] = f"取得エラー: {type(e).__name__}: {e}"
+                ctx["message"] = f"取得エラー: {type(e).__name__}: {e}\n（取得済みのページは保存してあるので、同じ条件でもう一度押すと続きから取得するよ）"
                 return render_template_string(HTML, **ctx)
 
+            # 新しい順のまま書き出す（本物のアーカイブと同じ。削除ツール側で古い順に並べ直す）
+            body = iter_tweets_js(itertools.chain([first], statuses) if first is not None else ())
+            return Response(
+                body,
+                mimetype="application/javascript; charset=utf-8",
+                headers={"Content-Disposition": "attachment; filename=tweets.js"},
+            )
+
     return render_template_string(HTML, **ctx)
 
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus のテキスト形式（API応答時間・取得の待ち時間・レート枠など）
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,536 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from api_client import ApiClient, credential_key, get_client
+from rate_limit import RateLimitScheduler
+
+# 接続先とデータの置き場所（ベンチマークでは環境変数でモックサーバー・一時ディレクトリに向ける）
+API_BASE = os.environ.get("TWITTER_API_V2_BASE", "https://api.x.com/2")
+HOME_DIR = os.environ.get("TWEET_TOOLS_HOME") or os.path.dirname(__file__)
+
+# 取得の並列化とチェックポイント
+FETCH_WINDOWS = 4           # タイムラインを何個の期間（start_time〜end_time）に分けて並行取得するか
+FETCH_INTERVAL_SEC = 1.0    # レートヘッダが無いときのページ間隔
+CHECKPOINT_DIR = os.path.join(HOME_DIR, "data", "fetch_checkpoints")
+CHECKPOINT_VERSION = 2
+CHECKPOINT_TTL_SEC = 7 * 24 * 60 * 60  # これより前に始めた・これだけ触られていないチェックポイントは捨てる
+TWITTER_LAUNCH = datetime(2006, 3, 21, tzinfo=timezone.utc)  # ユーザーの created_at が取れないときの下限
+
+# 取得結果のキャッシュ
+TIMELINE_CACHE_DIR = os.path.join(HOME_DIR, "data", "timeline_cache")
+USER_CACHE_TTL_SEC = 10 * 60  # ユーザー名 → ユーザー情報 を覚えておく時間
+
+# 計測（/metrics）
+FETCH_WAIT_SECONDS = metrics.histogram(
+    "tweet_tools_fetch_wait_seconds", "1ページを取りに行くまでの送信枠の待ち時間", (), metrics.SLEEP_BUCKETS)
+FETCH_CHECKPOINT_SECONDS = metrics.histogram(
+    "tweet_tools_fetch_checkpoint_seconds", "1ページ分のチェックポイント書き込み（fsync 込み）の時間")
+FETCH_PAGES = metrics.counter("tweet_tools_fetch_pages_total", "取得したページ数")
+FETCH_TWEETS = metrics.counter("tweet_tools_fetch_tweets_total", "取得したツイート数")
+_active_limiters: "weakref.WeakKeyDictionary[RateLimitScheduler, str]" = weakref.WeakKeyDictionary()
+
+# ---- helpers ----
+def auth_headers(bearer: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {bearer}"}
+
+def client_for(bearer: str) -> ApiClient:
+    # Bearer ごとに keep-alive セッションを使い回す
+    return get_client(("bearer", bearer), headers=auth_headers(bearer))
+
+def wait_for_slot(limiter: RateLimitScheduler, stop: threading.Event) -> bool:
+    # レートヘッダに従って送信枠が空くまで待つ（stop されたら False）
+    t0 = time.perf_counter()
+    try:
+        while not stop.is_set():
+            at = limiter.try_acquire()
+            if not at:
+                return True
+            stop.wait(min(1.0, max(0.0, at - time.time())))
+        return False
+    finally:
+        FETCH_WAIT_SECONDS.observe(time.perf_counter() - t0)
+
+def collect_metrics() -> List[metrics.Family]:
+    # /metrics 用: 取得中のタイムラインごとのレート枠の残り
+    headroom: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for limiter, user_id in list(_active_limiters.items()):
+        for k, v in limiter.headroom().items():
+            headroom.setdefault(k, []).append(({"user_id": user_id}, v))
+    return [(f"tweet_tools_fetch_ratelimit_{k}", "gauge", f"取得の送信枠（RateLimitScheduler.headroom の {k}）", samples)
+            for k, samples in headroom.items()]
+
+metrics.REGISTRY.add_collector(collect_metrics)
+
+def iso_utc(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def exclude_param_for(include_rts: bool, exclude_replies: bool) -> Optional[str]:
+    excludes = []
+    if not include_rts: excludes.append("retweets")
+    if exclude_replies: excludes.append("replies")
+    return ",".join(excludes) if excludes else None
+
+# ---- API ----
+_user_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_user_cache_lock = threading.Lock()
+
+def get_user_by_username(bearer: str, username: str) -> Dict[str, Any]:
+    # 同じトークン・ユーザー名なら USER_CACHE_TTL_SEC の間は問い合わせ結果を使い回す（成功時だけ覚える）
+    key = (credential_key(("bearer", bearer)), username.lower())
+    now = time.time()
+    with _user_cache_lock:
+        hit = _user_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    url = f"{API_BASE}/users/by/username/{username}"
+    r = client_for(bearer).get(url, params={"user.fields": "created_at"}, timeout=20)
+    if r.status_code != 200:
+        raise RuntimeError(f"users/by/username {r.status_code}: {r.text[:300]}")
+    user = r.json()["data"]
+    with _user_cache_lock:
+        for k in [k for k, (exp, _) in _user_cache.items() if exp <= now]:
+            del _user_cache[k]
+        _user_cache[key] = (now + USER_CACHE_TTL_SEC, user)
+    return user
+
+class FetchCheckpoint:
+    """
+    期間ごとの取得状況（次の pagination_token・完了したか）と取得済みページをディスクに残す。
+    同じ条件で再実行すると、各期間の最後のトークンから続きを取得する。
+    再実行までに投稿されたツイートは、一番新しい期間の後ろ（前回の終わり〜今）に期間を足して取る。
+    CHECKPOINT_TTL_SEC より古いものは使わずに消す（条件を変えて放置されたものも、次に作るときに消す）。
+    """
+
+    def __init__(self, user_id: str, params: Dict[str, Any]):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        key = hashlib.sha256(json.dumps([user_id, params], sort_keys=True).encode()).hexdigest()[:16]
+        self.state_path = os.path.join(CHECKPOINT_DIR, f"{user_id}_{key}.json")
+        self.pages_path = os.path.join(CHECKPOINT_DIR, f"{user_id}_{key}.pages.jsonl")
+        self._lock = threading.Lock()
+        self._cleared = False
+        self.windows: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        remove_stale_checkpoints()
+
+    def load(self) -> bool:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != CHECKPOINT_VERSION:
+                raise ValueError("old checkpoint")
+            windows, created_at = state["windows"], float(state["created_at"])
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError):
+            self._remove_files()  # 壊れている・古い形式 → 最初から
+            return False
+        if time.time() - created_at > CHECKPOINT_TTL_SEC:
+            self._remove_files()
+            return False
+        with self._lock:
+            self.windows, self.created_at = windows, created_at
+            # 前回の終わり（期間の end_time はその時点の「今」）以降に投稿された分の期間を先頭に足す
+            until = iso_utc(datetime.now(timezone.utc))
+            if windows and windows[0]["end_time"] < until:
+                windows.insert(0, {"start_time": windows[0]["end_time"], "end_time": until,
+                                   "next_token": None, "count": 0, "done": False})
+                self._save_locked()
+        return True
+
+    def _save_locked(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CHECKPOINT_VERSION, "created_at": self.created_at, "windows": self.windows}, f)
+        os.replace(tmp, self.state_path)
+
+    def start(self, windows: List[Dict[str, Any]]):
+        with self._lock:
+            self.windows = windows
+            self.created_at = time.time()
+            if os.path.exists(self.pages_path):
+                os.remove(self.pages_path)
+            self._save_locked()
+
+    def add_page(self, index: int, batch: List[Dict[str, Any]], next_token: Optional[str]):
+        # ページ本体を先に書いてから状態を進める（途中で落ちても重複で済む＝読み込み時に除去）
+        with self._lock:
+            if self._cleared:
+                return  # 完了後に届いた取りすぎのページ
+            with open(self.pages_path, "a", encoding="utf-8") as f:
+                # 期間は開始時刻で記録する（再開時に先頭へ期間を足すと番号がずれるので）
+                f.write(json.dumps({"window": self.windows[index]["start_time"], "data": batch}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            w = self.windows[index]
+            w["next_token"] = next_token
+            w["count"] += len(batch)
+            w["done"] = not next_token
+            self._save_locked()
+
+    def pages(self) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """取得済みのページを (期間の番号, ツイート) で書き込み順に返す"""
+        numbers = {w["start_time"]: i for i, w in enumerate(self.windows)}
+        try:
+            with open(self.pages_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        page = json.loads(line)
+                    except ValueError:
+                        continue  # 書きかけの最終行
+                    if page.get("window") in numbers:
+                        yield numbers[page["window"]], page["data"]
+        except OSError:
+            return
+
+    def _remove_files(self):
+        for path in (self.state_path, self.pages_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """取得が完了したら呼ぶ（以降に届いたページは書かない）"""
+        with self._lock:
+            self._cleared = True
+        self._remove_files()
+
+def remove_stale_checkpoints(now: Optional[float] = None):
+    """CHECKPOINT_TTL_SEC のあいだ更新されていないチェックポイント（途中で放置されたもの）を消す"""
+    now = time.time() if now is None else now
+    try:
+        names = os.listdir(CHECKPOINT_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > CHECKPOINT_TTL_SEC:
+                os.remove(path)
+        except OSError:
+            continue  # ほかのプロセスが先に消した
+
+class TimelineCache:
+    """
+    取得済みのタイムラインをユーザーID（と除外条件）ごとにディスクへ残す。
+    ツイートは新しい順の JSON Lines、一番新しいIDなどは別の小さな JSON に持つ。
+    次回は since_id でそれより新しい分だけ取って先頭に足す。
+    """
+
+    def __init__(self, user_id: str, exclude_param: Optional[str]):
+        os.makedirs(TIMELINE_CACHE_DIR, exist_ok=True)
+        name = f"{user_id}_{(exclude_param or 'all').replace(',', '-')}"
+        self.tweets_path = os.path.join(TIMELINE_CACHE_DIR, f"{name}.jsonl")
+        self.meta_path = os.path.join(TIMELINE_CACHE_DIR, f"{name}.json")
+        self.meta: Dict[str, Any] = {}
+
+    def load(self) -> bool:
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            return bool(self.meta.get("newest_id")) and os.path.exists(self.tweets_path)
+        except (OSError, ValueError):
+            return False
+
+    def covers(self, total_count: int) -> bool:
+        """新しい順に total_count 件を出せるか（件数が足りるか、最古まで取り切っているか）"""
+        return self.meta.get("count", 0) >= total_count or bool(self.meta.get("complete"))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.tweets_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def write(self, tweets: Iterable[Dict[str, Any]], total_count: int, complete: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        tweets（新しい順）を流しながら書き出し、最後まで流れたら置き換える。
+        途中で止まったとき（エラー・ダウンロード中断）は元のキャッシュをそのまま残す。
+        total_count 件に届かなかったときは、タイムラインの最古まで取り切ったとみなす（complete）。
+        """
+        tmp = self.tweets_path + ".tmp"
+        newest, count = None, 0
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for tw in tweets:
+                    f.write(json.dumps(tw, ensure_ascii=False) + "\n")
+                    if newest is None:
+                        newest = str(tw["id"])
+                    count += 1
+                    yield tw
+            os.replace(tmp, self.tweets_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.meta = {"newest_id": newest, "count": count, "complete": complete or count < total_count,
+                     "updated_at": time.time()}
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+def split_windows(since: datetime, until: datetime, n: int) -> List[Dict[str, Any]]:
+    """[since, until) を n 個の期間に分ける（新しい期間が先頭）"""
+    n = max(1, n)
+    step = (until - since) / n
+    out = []
+    for i in range(n):
+        end = until - step * i
+        start = since if i == n - 1 else until - step * (i + 1)
+        out.append({"start_time": iso_utc(start), "end_time": iso_utc(end),
+                    "next_token": None, "count": 0, "done": False})
+    return out
+
+def iter_user_tweets_v2(
+    bearer: str, user_id: str, total_count: int,
+    include_rts: bool, exclude_replies: bool,
+    user_created_at: Optional[str] = None, windows: int = FETCH_WINDOWS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    タイムラインを期間ごとに分けて並行取得し、取れたページから1件ずつ返す（レート枠は1つのスケジューラで共有）。
+    1ページ取るごとにチェックポイントへ保存し、エラーや再起動のあとは同じ条件で呼べば続きから取得する。
+    新しい順に total_count 件を返す。新しい期間から順に出すので、古い期間のページは手前の期間が終わるまで溜めておく。
+    """
+    url = f"{API_BASE}/users/{user_id}/tweets"
+    client = client_for(bearer)
+
+    exclude_param = exclude_param_for(include_rts, exclude_replies)
+
+    ckpt = FetchCheckpoint(user_id, {"total_count": total_count, "exclude": exclude_param})
+    if not ckpt.load():
+        try:
+            since = datetime.fromisoformat(user_created_at.replace("Z", "+00:00")) if user_created_at else TWITTER_LAUNCH
+        except ValueError:
+            since = TWITTER_LAUNCH
+        ckpt.start(split_windows(since, datetime.now(timezone.utc), windows))
+
+    limiter = RateLimitScheduler(fallback_interval=FETCH_INTERVAL_SEC)
+    _active_limiters[limiter] = user_id
+    stop = threading.Event()
+    events: "queue.Queue[Tuple[str, int, Any]]" = queue.Queue()  # ("page", 期間, batch) / ("end", 期間, future)
+
+    def enough() -> bool:
+        # 新しい期間から順に「取り終えた期間＋最初の未完了期間の取得済み分」が total_count に届けば十分
+        n = 0
+        for w in ckpt.windows:
+            n += w["count"]
+            if n >= total_count:
+                return True
+            if not w["done"]:
+                return False
+        return True
+
+    def fetch_window(index: int):
+        w = ckpt.windows[index]
+        while not w["done"] and not stop.is_set():
+            params = {
+                "max_results": 100,
+                "tweet.fields": "created_at,lang,public_metrics,entities,source",
+                "start_time": w["start_time"], "end_time": w["end_time"],
+            }
+            if exclude_param: params["exclude"] = exclude_param
+            if w["next_token"]: params["pagination_token"] = w["next_token"]
+
+            if not wait_for_slot(limiter, stop):
+                return
+            try:
+                r = client.get(url, params=params, timeout=30)
+            except Exception:
+                limiter.release()
+                raise
+            limiter.update(r)
+            if r.status_code in (429, 503):
+                continue  # スケジューラが reset まで待たせる
+            if r.status_code != 200:
+                raise RuntimeError(f"/tweets {r.status_code}: {r.text[:300]}")
+
+            data = r.json()
+            batch = data.get("data", [])
+            next_token = data.get("meta", {}).get("next_token") if batch else None
+            with FETCH_CHECKPOINT_SECONDS.time():
+                ckpt.add_page(index, batch, next_token)
+            FETCH_PAGES.inc()
+            FETCH_TWEETS.inc(len(batch))
+            events.put(("page", index, batch))
+            if enough():
+                stop.set()
+
+    # 前回までに取得済みのページは期間ごとのバッファに戻しておく
+    buffers: Dict[int, Deque[Dict[str, Any]]] = {i: deque() for i in range(len(ckpt.windows))}
+    for index, batch in ckpt.pages():
+        buffers[index].extend(batch)
+
+    ex: Optional[ThreadPoolExecutor] = None
+    finished = set(range(len(ckpt.windows)))  # もうページが届かない期間
+    if not enough():
+        finished = {i for i, w in enumerate(ckpt.windows) if w["done"]}
+        ex = ThreadPoolExecutor(max_workers=len(ckpt.windows), thread_name_prefix="fetch")
+        for i in range(len(ckpt.windows)):
+            ex.submit(fetch_window, i).add_done_callback(lambda fut, i=i: events.put(("end", i, fut)))
+
+    seen = set()
+    try:
+        cur = 0
+        while cur < len(ckpt.windows) and len(seen) < total_count:
+            buf = buffers[cur]
+            while buf and len(seen) < total_count:
+                tw = buf.popleft()
+                tid = str(tw["id"])
+                if tid in seen:
+                    continue  # 書き込み途中で落ちたページの重複
+                seen.add(tid)
+                yield tw
+            if len(seen) >= total_count:
+                break
+            if cur in finished:
+                cur += 1
+                continue
+            kind, index, payload = events.get()
+            if kind == "page":
+                buffers[index].extend(payload)
+            else:
+                finished.add(index)
+                exc = payload.exception()
+                if exc is not None:
+                    raise exc
+    finally:
+        # 最後まで読まれなかった（エラー・ダウンロード中断）ときは、チェックポイントを残して次回再開
+        stop.set()
+        _active_limiters.pop(limiter, None)
+        if ex is not None:
+            ex.shutdown(wait=False)
+
+    # ここまで来たら完了。チェックポイントは片付ける
+    ckpt.clear()
+
+def fetch_user_tweets_v2(
+    bearer: str, user_id: str, total_count: int,
+    include_rts: bool, exclude_replies: bool,
+    user_created_at: Optional[str] = None, windows: int = FETCH_WINDOWS,
+) -> List[Dict[str, Any]]:
+    """iter_user_tweets_v2() の結果をリストで返す（新しい順）"""
+    return list(iter_user_tweets_v2(bearer, user_id, total_count, include_rts, exclude_replies,
+                                    user_created_at=user_created_at, windows=windows))
+
+def fetch_user_tweets_since(bearer: str, user_id: str, since_id: str, exclude_param: Optional[str]) -> List[Dict[str, Any]]:
+    """since_id より新しいツイートを全部（新しい順で）取る。差分なので通常は1ページで終わる"""
+    url = f"{API_BASE}/users/{user_id}/tweets"
+    client = client_for(bearer)
+    limiter = RateLimitScheduler(fallback_interval=FETCH_INTERVAL_SEC)
+    stop = threading.Event()
+    out: List[Dict[str, Any]] = []
+    next_token = None
+    while True:
+        params = {
+            "max_results": 100,
+            "tweet.fields": "created_at,lang,public_metrics,entities,source",
+            "since_id": since_id,
+        }
+        if exclude_param: params["exclude"] = exclude_param
+        if next_token: params["pagination_token"] = next_token
+
+        wait_for_slot(limiter, stop)
+        try:
+            r = client.get(url, params=params, timeout=30)
+        except Exception:
+            limiter.release()
+            raise
+        limiter.update(r)
+        if r.status_code in (429, 503):
+            continue
+        if r.status_code != 200:
+            raise RuntimeError(f"/tweets {r.status_code}: {r.text[:300]}")
+
+        data = r.json()
+        batch = data.get("data", [])
+        FETCH_PAGES.inc()
+        FETCH_TWEETS.inc(len(batch))
+        out.extend(batch)
+        next_token = data.get("meta", {}).get("next_token") if batch else None
+        if not next_token:
+            return out
+
+def iter_timeline(
+    bearer: str, user: Dict[str, Any], total_count: int,
+    include_rts: bool, exclude_replies: bool, use_cache: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """
+    新しい順に total_count 件を返す。キャッシュで足りるときは since_id で新しい分だけ取って先頭に足し、
+    足りないとき（初回・件数を増やしたとき・use_cache=False）は全体を取り直してキャッシュを作り直す。
+    """
+    exclude_param = exclude_param_for(include_rts, exclude_replies)
+    cache = TimelineCache(user["id"], exclude_param)
+
+    if use_cache and cache.load() and cache.covers(total_count):
+        newer = fetch_user_tweets_since(bearer, user["id"], cache.meta["newest_id"], exclude_param)
+        merged = itertools.chain(newer, cache)
+        for i, tw in enumerate(cache.write(merged, total_count, complete=cache.meta.get("complete", False))):
+            if i < total_count:
+                yield tw
+        return
+
+    statuses = iter_user_tweets_v2(bearer, user["id"], total_count, include_rts, exclude_replies,
+                                   user_created_at=user.get("created_at"))
+    yield from cache.write(statuses, total_count)
+
+# ---- mapping to EXACT format the deleter expects ----
+def to_archive_item_v2(s: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    必須： item["tweet"]["id_str"] を必ず入れる。
+    互換性UP： full_text と text の両方に同値を入れる。
+    ※ 削除ツールの parse は id_str をキーに見てるよ。
+    """
+    tid = str(s.get("id"))
+    text = s.get("text") or ""
+    tweet_obj = {
+        "id_str": tid,          # ★必須（削除側が参照）
+        "id": tid,              # 互換用（あってもOK）
+        "full_text": text,      # 互換用（優先で読まれる場合あり）
+        "text": text,           # 互換用（保険）
+        # 以下は削除には不要だが正規っぽくなる（任意）
+        "created_at": s.get("created_at"),
+        "lang": s.get("lang"),
+        "source": s.get("source", ""),
+        "retweet_count": str((s.get("public_metrics") or {}).get("retweet_count", 0)),
+        "favorite_count": str((s.get("public_metrics") or {}).get("like_count", 0)),
+        "entities": s.get("entities", {}) or {},
+    }
+    return {"tweet": tweet_obj}
+
+def to_archive_items_v2(statuses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [to_archive_item_v2(s) for s in statuses]
+
+def to_tweets_js(part0: List[Dict[str, Any]]) -> bytes:
+    buf = io.StringIO()
+    buf.write("window.YTD.tweets.part0 = ")
+    buf.write(json.dumps(part0, ensure_ascii=False))
+    buf.write(";\n")
+    return buf.getvalue().encode("utf-8")
+
+def iter_tweets_js(statuses: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    to_tweets_js() のストリーム版。取得できたツイートから順に1件ずつ書き出す。
+    途中でエラーになったら、配列は閉じずにエラーをコメントで残す（途中までのファイルを完全なアーカイブとして
+    読み込めないようにするため。チェックポイントは残るので再実行で続きから）。
+    """
+    yield b"window.YTD.tweets.part0 = ["
+    sep = "\n  "
+    try:
+        for s in statuses:
+            yield (sep + json.dumps(to_archive_item_v2(s), ensure_ascii=False)).encode("utf-8")
+            sep = ",\n  "
+    except Exception as e:
+        message = " ".join(f"{type(e).__name__}: {e}".splitlines())
+        yield f"\n// 取得エラー（途中で終わっているので、このファイルは読み込めません）: {message}\n".encode("utf-8")
+        return
+    yield b"\n];\n"
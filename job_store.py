@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tweet_queue import TweetQueue, restore_created, stored_posted_at
+
+# 書き込みのまとめ方（削除ループを遅くしないよう、件数か時間のどちらかでまとめてコミット）
+FLUSH_BATCH = 200
+FLUSH_INTERVAL_SEC = 2.0
+
+TEXT_HEAD_LEN = 120  # ログと同じく本文は先頭だけ保存する
+
+# 実行中のジョブの持ち主（プロセス）の確認。持ち主は HEARTBEAT_SEC ごとに heartbeat_at を更新し、
+# LEASE_SEC 更新が途絶えたジョブだけを「持ち主が落ちた」とみなして中断扱い・再開の対象にする
+HEARTBEAT_SEC = 10.0
+LEASE_SEC = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    account_key  TEXT NOT NULL,
+    fingerprint  TEXT NOT NULL,
+    status       TEXT NOT NULL,   -- running / interrupted / canceled / error / finished
+    owner_pid    INTEGER,         -- running の間だけ、動かしているプロセスの pid
+    heartbeat_at REAL,
+    total        INTEGER NOT NULL,
+    log_filename TEXT,
+    message      TEXT NOT NULL DEFAULT '',
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_account ON jobs (account_key, updated_at);
+CREATE TABLE IF NOT EXISTS items (
+    job_id    TEXT NOT NULL,
+    seq       INTEGER NOT NULL,
+    tweet_id  TEXT NOT NULL,
+    text_head TEXT NOT NULL,
+    posted_at TEXT,
+    status    TEXT,                -- NULL = 未処理 / OK / NG(404) ...
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+# 止まっているジョブ。running は持ち主が落ちた（heartbeat が LEASE_SEC 途絶えた）ものだけ再開できる
+RESUMABLE = ("interrupted", "canceled", "error")
+
+
+def fingerprint_ids(ids: Iterable[str]) -> str:
+    """削除対象IDの並びから、同じアップロードかどうかを見分けるためのハッシュを作る"""
+    h = hashlib.sha256()
+    for tid in ids:
+        h.update(tid.encode("ascii", "replace"))
+        h.update(b",")
+    return h.hexdigest()
+
+
+class JobStore:
+    """
+    削除ジョブの進捗を SQLite（WALモード）に記録する。
+    プロセスが落ちても、再起動後に未処理のIDから続きを実行できる。
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in (("owner_pid", "INTEGER"), ("heartbeat_at", "REAL")):
+            if name not in columns:  # 以前の版で作った DB
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+        self._heartbeat: Optional[threading.Thread] = None
+        self._pending: List[Tuple[str, str, int]] = []  # (status, job_id, seq)
+        self._last_flush = time.time()
+
+    def mark_interrupted(self):
+        """
+        持ち主のプロセスが落ちて実行中のまま残ったジョブ（heartbeat が LEASE_SEC 途絶えたもの）を「中断」扱いにする。
+        ジョブを実際に動かすプロセス（worker.py・cli.py）が起動時に呼ぶ。別のプロセスが動かしているジョブには触らない
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'interrupted', owner_pid = NULL"
+                " WHERE status = 'running' AND COALESCE(heartbeat_at, 0) < ?", (time.time() - LEASE_SEC,)
+            )
+
+    # ---- 持ち主の heartbeat ----
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        pid = os.getpid()
+        while True:
+            time.sleep(HEARTBEAT_SEC)
+            with self._lock:
+                try:
+                    self._conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE owner_pid = ? AND status = 'running'", (time.time(), pid)
+                    )
+                except sqlite3.ProgrammingError:  # close() 済み
+                    return
+
+    # ---- ジョブ ----
+    def create_job(self, account_key: str, tweets: Sequence[Dict[str, Any]], log_filename: Optional[str] = None,
+                   fingerprint: Optional[str] = None) -> str:
+        """tweets は {"id","text","posted_at"} の dict のリストか TweetQueue。fingerprint を省略すると tweets のIDから計算する"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        fp = fingerprint or fingerprint_ids(str(t["id"]) for t in tweets)
+        if isinstance(tweets, TweetQueue):
+            items = ((tid, text, stored_posted_at(tid, created)) for tid, text, created in tweets.columns())
+        else:
+            items = ((t["id"], t.get("text") or "", t.get("posted_at")) for t in tweets)
+        rows = (
+            (job_id, seq, str(tid), text[:TEXT_HEAD_LEN], posted_at)
+            for seq, (tid, text, posted_at) in enumerate(items)
+        )
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, account_key, fingerprint, status, total, log_filename, owner_pid,"
+                    " heartbeat_at, created_at, updated_at) VALUES (?, ?, ?, 'running', ?, ?, ?, ?, ?, ?)",
+                    (job_id, account_key, fp, len(tweets), log_filename, os.getpid(), now, now, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO items (job_id, seq, tweet_id, text_head, posted_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+        self._start_heartbeat()
+        return job_id
+
+    def find_resumable(self, account_key: str, fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        このアカウントで途中になっている一番新しいジョブ（fingerprint 指定時は同じ内容のものだけ）。
+        実行中のジョブは、このプロセスが動かしているものか持ち主が落ちたものだけ返す（別プロセスのジョブを二重に動かさない）
+        """
+        sql = ("SELECT job_id, status, total, log_filename FROM jobs"
+               f" WHERE account_key = ? AND (status IN ({','.join('?' * len(RESUMABLE))})"
+               " OR (status = 'running' AND (owner_pid = ? OR COALESCE(heartbeat_at, 0) < ?)))")
+        params: List[Any] = [account_key, *RESUMABLE, os.getpid(), time.time() - LEASE_SEC]
+        if fingerprint is not None:
+            sql += " AND fingerprint = ?"
+            params.append(fingerprint)
+        sql += " ORDER BY updated_at DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        if not row:
+            return None
+        return {"job_id": row[0], "status": row[1], "total": row[2], "log_filename": row[3]}
+
+    def set_status(self, job_id: str, status: str, message: str = ""):
+        """running にするとこのプロセスが持ち主になり、それ以外にすると持ち主を外す"""
+        self.flush()
+        now = time.time()
+        owner = os.getpid() if status == "running" else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, owner_pid = ?, heartbeat_at = ?, updated_at = ?"
+                " WHERE job_id = ?",
+                (status, message, owner, now, now, job_id),
+            )
+        if owner is not None:
+            self._start_heartbeat()
+
+    def set_log_filename(self, job_id: str, log_filename: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET log_filename = ? WHERE job_id = ?", (log_filename, job_id))
+
+    def progress(self, job_id: str) -> Dict[str, Any]:
+        """total / done / ok / ng / skipped / log_filename"""
+        self.flush()
+        with self._lock:
+            total, log_filename = self._conn.execute(
+                "SELECT total, log_filename FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            done, ok, skipped = self._conn.execute(
+                "SELECT COUNT(status), COALESCE(SUM(status = 'OK'), 0), COALESCE(SUM(status LIKE 'SKIP%'), 0)"
+                " FROM items WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return {"total": total, "done": done, "ok": ok, "ng": done - ok - skipped, "skipped": skipped,
+                "log_filename": log_filename}
+
+    def pending_items(self, job_id: str) -> TweetQueue:
+        """未処理のツイートを元の順番（古い順）の TweetQueue で返す"""
+        self.flush()
+        queue = TweetQueue()
+        with self._lock:
+            for seq, tid, text, posted_at in self._conn.execute(
+                "SELECT seq, tweet_id, text_head, posted_at FROM items"
+                " WHERE job_id = ? AND status IS NULL ORDER BY seq", (job_id,)
+            ):
+                tid = int(tid)
+                queue.append(tid, text, restore_created(tid, posted_at), seq)
+        return queue
+
+    # ---- 1件ごとの結果（まとめて書く） ----
+    def record(self, job_id: str, seq: int, status: str):
+        with self._lock:
+            self._pending.append((status, job_id, seq))
+            due = (len(self._pending) >= FLUSH_BATCH
+                   or time.time() - self._last_flush >= FLUSH_INTERVAL_SEC)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.time()
+            if not pending:
+                return
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("UPDATE items SET status = ? WHERE job_id = ? AND seq = ?", pending)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,300 @@
+import bisect
+import json
+import os
+import threading
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from log_tail import iter_records, log_sizes, read_new_lines
+from tweet_archive import JST
+from tweet_queue import NO_TIME, format_posted_at
+
+INDEX_DIRNAME = ".log_index"   # LOG_DIR の下に作る（区切りごとの .bin と manifest.json）
+MANIFEST_FILENAME = "manifest.json"
+INDEX_VERSION = 1
+
+# 1行ぶんの列（型コード）。ID で並べた区切り（segment）ごとに、列ごとの配列として持つ
+COLUMNS = (
+    ("ids", "Q"),        # ツイートID
+    ("response_at", "q"),  # 応答時刻（UNIX秒）
+    ("posted_at", "q"),  # 投稿時刻（UNIX秒。不明なら NO_TIME）
+    ("offsets", "Q"),    # ログファイル内の行の先頭バイト位置
+    ("files", "I"),      # ログファイルの番号（manifest の files の位置）
+    ("statuses", "H"),   # 状態の番号（manifest の statuses の位置）
+)
+MERGE_RATIO = 2  # 新しい区切りが1つ前の区切りの 1/MERGE_RATIO 以上になったらまとめる（区切りの数は log2 件数程度）
+
+
+def _iso_epoch(raw: bytes, days: Dict[bytes, int]) -> int:
+    """
+    ログの ISO 時刻（YYYY-MM-DDTHH:MM:SS+09:00）を UNIX秒にする。
+    日付とタイムゾーンごとの 0時の UNIX秒を days に覚えておき、時分秒は足し算で済ませる（行ごとに datetime を作らない）
+    """
+    if len(raw) < 19 or raw[10:11] != b"T" or raw[19:20] == b".":
+        return int(datetime.fromisoformat(raw.decode("ascii")).timestamp())
+    key = raw[:10] + raw[19:]
+    base = days.get(key)
+    if base is None:
+        base = days[key] = int(datetime.fromisoformat((raw[:10] + b"T00:00:00" + raw[19:]).decode("ascii")).timestamp())
+    return base + int(raw[11:13]) * 3600 + int(raw[14:16]) * 60 + int(raw[17:19])
+
+
+def status_class(status: str) -> str:
+    """ログの状態を集計用の分類（ok / skipped / retry / ng）にする"""
+    if status == "OK":
+        return "ok"
+    if status.startswith("SKIP"):
+        return "skipped"
+    if status.startswith("RETRY"):
+        return "retry"
+    return "ng"
+
+
+class _Segment:
+    """ID 昇順（同じIDは取り込んだ順）に並んだ行の列"""
+
+    __slots__ = tuple(name for name, _ in COLUMNS)
+
+    def __init__(self):
+        for name, code in COLUMNS:
+            setattr(self, name, array(code))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def columns(self) -> List[array]:
+        return [getattr(self, name) for name, _ in COLUMNS]
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, ...]]) -> "_Segment":
+        seg = cls()
+        rows.sort(key=lambda r: r[0])
+        for col, values in zip(seg.columns(), zip(*rows)):
+            col.extend(values)
+        return seg
+
+    @classmethod
+    def merge(cls, older: "_Segment", newer: "_Segment") -> "_Segment":
+        ids = older.ids + newer.ids
+        # 2本の昇順の並びをつなげたものなので、安定ソートはほぼ線形で済む（同じIDは older が先のまま）
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        seg = cls()
+        for name, code in COLUMNS:
+            joined = getattr(older, name) + getattr(newer, name)
+            setattr(seg, name, array(code, map(joined.__getitem__, order)))
+        return seg
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for col in self.columns():
+                col.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, n: int) -> "_Segment":
+        seg = cls()
+        with open(path, "rb") as f:
+            for col in seg.columns():
+                col.fromfile(f, n)
+        return seg
+
+    def find(self, tid: int) -> range:
+        return range(bisect.bisect_left(self.ids, tid), bisect.bisect_right(self.ids, tid))
+
+
+class LogIndex:
+    """
+    LOG_DIR の deleted_ids_*.log を検索・集計するための索引。
+    行ごとに (ID, 応答時刻, 投稿時刻, ファイル, 行の位置, 状態) を ID 順の区切りにしてディスクに保存し、
+    ログは前回読んだ位置から差分だけ読む（追記された分は小さな区切りとして足し、大きさが揃ったらまとめる）。
+    状態ごと・月ごとの件数は取り込むときに数えておくので、集計はログを読み直さずに返せる。
+    """
+
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+        self.index_dir = os.path.join(log_dir, INDEX_DIRNAME)
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self._files: List[str] = []
+        self._file_numbers: Dict[str, int] = {}
+        self._statuses: List[str] = []
+        self._status_numbers: Dict[str, int] = {}
+        self._offsets: Dict[str, int] = {}
+        self._segments: List[_Segment] = []
+        self._segment_names: List[str] = []
+        self._by_status: Dict[str, int] = {}
+        self._by_month: Dict[str, Dict[str, int]] = {}
+        self._next_segment = 0
+
+    # ---- 永続化 ----
+    def _load(self):
+        try:
+            with open(os.path.join(self.index_dir, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != INDEX_VERSION:
+                return
+            segments = [_Segment.load(os.path.join(self.index_dir, name), n) for name, n in manifest["segments"]]
+        except (OSError, ValueError, KeyError, EOFError):
+            return  # 無い・壊れている → 全ログを読み直す
+        self._files = manifest["files"]
+        self._file_numbers = {name: i for i, name in enumerate(self._files)}
+        self._statuses = manifest["statuses"]
+        self._status_numbers = {s: i for i, s in enumerate(self._statuses)}
+        self._offsets = manifest["offsets"]
+        self._segments = segments
+        self._segment_names = [name for name, _ in manifest["segments"]]
+        self._by_status = manifest["by_status"]
+        self._by_month = manifest["by_month"]
+        self._next_segment = manifest["next_segment"]
+
+    def _save_manifest(self):
+        manifest = {
+            "version": INDEX_VERSION,
+            "files": self._files, "statuses": self._statuses, "offsets": self._offsets,
+            "segments": [[name, len(seg)] for name, seg in zip(self._segment_names, self._segments)],
+            "by_status": self._by_status, "by_month": self._by_month,
+            "next_segment": self._next_segment,
+        }
+        path = os.path.join(self.index_dir, MANIFEST_FILENAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def _add_segment(self, seg: _Segment):
+        """区切りを足し、1つ前と大きさが近ければまとめてから保存する"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        obsolete: List[str] = []
+        while self._segments and len(self._segments[-1]) <= MERGE_RATIO * len(seg):
+            obsolete.append(self._segment_names.pop())
+            seg = _Segment.merge(self._segments.pop(), seg)
+        name = f"seg_{self._next_segment:06d}.bin"
+        self._next_segment += 1
+        seg.save(os.path.join(self.index_dir, name))
+        self._segments.append(seg)
+        self._segment_names.append(name)
+        # manifest を書き換えてから古い区切りを消す（途中で落ちても manifest が指すファイルは残っている）
+        self._save_manifest()
+        for old in obsolete:
+            try:
+                os.remove(os.path.join(self.index_dir, old))
+            except OSError:
+                pass
+
+    # ---- 更新 ----
+    def _number(self, table: List[str], numbers: Dict[str, int], value: str) -> int:
+        n = numbers.get(value)
+        if n is None:
+            n = numbers[value] = len(table)
+            table.append(value)
+        return n
+
+    def _read_new_lines(self, filename: str, offset: int, rows: List[Tuple[int, ...]]) -> int:
+        data, new_offset = read_new_lines(os.path.join(self.log_dir, filename), offset)
+        file_no = self._number(self._files, self._file_numbers, filename)
+        days: Dict[bytes, int] = {}
+        status_numbers: Dict[bytes, int] = {}     # 状態（バイト列のまま）→ 番号
+        counts: Dict[Tuple[bytes, bytes], int] = {}  # (年月, 状態) → 行数（最後にまとめて集計に足す）
+        for line_at, cols in iter_records(data, offset):
+            if len(cols) < 3:
+                continue
+            try:
+                tid = int(cols[1])
+                response_at = _iso_epoch(cols[0], days)
+                posted = _iso_epoch(cols[3], days) if len(cols) > 3 and cols[3] else NO_TIME
+            except (ValueError, UnicodeDecodeError):
+                continue
+            raw_status = cols[2]
+            status_no = status_numbers.get(raw_status)
+            if status_no is None:
+                status = raw_status.decode("utf-8", errors="replace")
+                status_no = status_numbers[raw_status] = self._number(self._statuses, self._status_numbers, status)
+            rows.append((tid, response_at, posted, line_at, file_no, status_no))
+            # 応答時刻は JST で書いてあるので、先頭の YYYY-MM がそのまま JST の年月
+            key = (cols[0][:7], raw_status)
+            counts[key] = counts.get(key, 0) + 1
+
+        for (raw_month, raw_status), n in counts.items():
+            status = self._statuses[status_numbers[raw_status]]
+            self._by_status[status] = self._by_status.get(status, 0) + n
+            month = self._by_month.setdefault(raw_month.decode("ascii"), {})
+            cls = status_class(status)
+            month[cls] = month.get(cls, 0) + n
+        return new_offset
+
+    def refresh(self):
+        """ログの追記分を取り込む（変化が無ければファイルの大きさを見るだけ）"""
+        with self._lock:
+            sizes = log_sizes(self.log_dir)
+            if any(sizes[name] < offset for name, offset in self._offsets.items() if name in sizes):
+                # 書き直されたログがある → 最初から作り直す（行の位置が変わるので）
+                for old in self._segment_names:
+                    try:
+                        os.remove(os.path.join(self.index_dir, old))
+                    except OSError:
+                        pass
+                self._reset()
+            rows: List[Tuple[int, ...]] = []
+            changed = False
+            for name, size in sizes.items():
+                offset = self._offsets.get(name, 0)
+                if size == offset:
+                    continue
+                try:
+                    new_offset = self._read_new_lines(name, offset, rows)
+                except OSError:
+                    continue
+                if new_offset != offset:
+                    self._offsets[name] = new_offset
+                    changed = True
+            if rows:
+                self._add_segment(_Segment.from_rows(rows))
+            elif changed:
+                os.makedirs(self.index_dir, exist_ok=True)
+                self._save_manifest()
+
+    # ---- 参照 ----
+    def _line_text(self, filename: str, offset: int) -> Optional[str]:
+        try:
+            with open(os.path.join(self.log_dir, filename), "rb") as f:
+                f.seek(offset)
+                line = f.readline()
+        except OSError:
+            return None  # ログが消された
+        cols = line.rstrip(b"\n").split(b"\t", 4)
+        return cols[4].decode("utf-8", errors="replace") if len(cols) > 4 else ""
+
+    def search(self, tid: int) -> List[Dict[str, Any]]:
+        """tid が記録された行（再実行・送り直しで複数あれば全部）を応答時刻の順に返す"""
+        hits: List[Tuple[int, str, int, int, str]] = []
+        with self._lock:
+            for seg in self._segments:
+                for i in seg.find(tid):
+                    hits.append((seg.response_at[i], self._statuses[seg.statuses[i]], seg.posted_at[i],
+                                 seg.offsets[i], self._files[seg.files[i]]))
+        hits.sort(key=lambda h: h[0])
+        return [{
+            "id": str(tid),
+            "status": status,
+            "response_at": datetime.fromtimestamp(response_at, JST).isoformat(timespec="seconds"),
+            "posted_at": format_posted_at(posted),
+            "log_filename": filename,
+            "offset": offset,
+            "text": self._line_text(filename, offset),
+        } for response_at, status, posted, offset, filename in hits]
+
+    def summary(self) -> Dict[str, Any]:
+        """状態ごと（NG はステータスコード別）・月ごと（応答時刻の JST の年月）の件数"""
+        with self._lock:
+            by_status = dict(sorted(self._by_status.items(), key=lambda kv: -kv[1]))
+            by_month = {m: dict(c) for m, c in sorted(self._by_month.items())}
+            return {
+                "lines": sum(len(seg) for seg in self._segments),
+                "files": len(self._offsets),
+                "by_status": by_status,
+                "by_month": by_month,
+            }
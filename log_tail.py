@@ -0,0 +1,41 @@
+import os
+import re
+from typing import Dict, Iterator, List, Tuple
+
+LOG_NAME_PATTERN = re.compile(r"^deleted_ids_.*\.log$")
+
+
+def log_sizes(log_dir: str) -> Dict[str, int]:
+    """log_dir の deleted_ids_*.log の名前 → 大きさ（名前順。消えた・読めないものは除く）"""
+    sizes: Dict[str, int] = {}
+    for name in sorted(n for n in os.listdir(log_dir) if LOG_NAME_PATTERN.match(n)):
+        try:
+            sizes[name] = os.path.getsize(os.path.join(log_dir, name))
+        except OSError:
+            continue
+    return sizes
+
+
+def read_new_lines(path: str, offset: int) -> Tuple[bytes, int]:
+    """
+    ログの offset から、改行で終わっている行までを読む（書きかけの最終行は次回に回す）。
+    戻り値: (読んだバイト列, 次に読む位置)。ファイルが offset より短くなっているか（書き直された）は呼び出し側で見る
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    return data[:end], offset + end
+
+
+def iter_records(data: bytes, offset: int, maxsplit: int = 4) -> Iterator[Tuple[int, List[bytes]]]:
+    """
+    read_new_lines で読んだ分の記録行を (行の先頭バイト位置, タブで分けた列) で返す（空行・# のヘッダ行は飛ばす）。
+    列は 応答時刻, ID, 状態, 投稿時刻, 本文 の順（バイト列のまま）
+    """
+    pos = offset
+    for line in data.split(b"\n")[:-1]:
+        line_at, pos = pos, pos + len(line) + 1
+        if not line or line.startswith(b"#"):
+            continue
+        yield line_at, line.split(b"\t", maxsplit)
@@ -0,0 +1,160 @@
+import math
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+
+class RateLimitScheduler:
+    """
+    x-rate-limit-limit / remaining / reset ヘッダを読んで送信タイミングを決めるトークンバケット。
+    残り枠があるうちは待たずに送り、枠切れ（残り0の 429 を含む）のときだけ reset まで待つ。
+    それ以外の 429/503（一時的な過負荷）はジッター付き指数バックオフで間を空ける。
+    ヘッダを返さないエンドポイントでは fallback_interval 秒ごとの送信にフォールバックする。
+    """
+
+    def __init__(self, fallback_interval: float = 20.0, window_sec: float = 900.0,
+                 min_interval: float = 0.0, max_backoff: float = 900.0):
+        self.fallback_interval = fallback_interval
+        self.window_sec = window_sec      # reset ヘッダが無いときに仮定する窓の長さ
+        self.min_interval = min_interval  # 枠が残っていても最低これだけは空ける
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._has_headers = False
+        self._limit = 0
+        self._remaining = 0
+        self._reset_at = 0.0
+        self._next_send_at = 0.0
+        self._inflight = 0
+        self._backoff = 0.0
+        self._latency: Optional[float] = None  # 応答時間の指数移動平均（秒）
+
+    # ---- 送信枠 ----
+    def _refill_locked(self, now: float):
+        if self._has_headers and self._reset_at and now >= self._reset_at:
+            self._remaining = self._limit
+            self._reset_at = now + self.window_sec
+
+    def try_acquire(self) -> float:
+        """
+        今すぐ送れるなら1件分の枠を消費して 0 を返す。送れないなら次に送れる見込み時刻（epoch秒）を返す。
+        枠を得た呼び出し側は送信結果を update() か release() で必ず返すこと。
+        待つ側は見込み時刻までの間も繰り返し呼ぶ（応答ヘッダで見込みが早まることがある）。
+        """
+        with self._lock:
+            now = time.time()
+            self._refill_locked(now)
+            at = max(now, self._next_send_at)
+            if self._has_headers and self._remaining <= 0:
+                at = max(at, self._reset_at)
+            if at > now:
+                return at
+
+            if not self._has_headers:
+                # ヘッダ情報が無い間は従来どおりの固定間隔
+                self._next_send_at = now + self.fallback_interval
+            else:
+                self._remaining -= 1
+                self._next_send_at = now + self.min_interval
+            self._inflight += 1
+            return 0.0
+
+    def peek(self) -> float:
+        """次に送れる見込み時刻（枠は消費しない）"""
+        with self._lock:
+            now = time.time()
+            self._refill_locked(now)
+            at = max(now, self._next_send_at)
+            if self._has_headers and self._remaining <= 0:
+                at = max(at, self._reset_at)
+            return at
+
+    def release(self):
+        """try_acquire() で枠を得たが応答が得られなかった（例外など）ときに呼ぶ"""
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+
+    def update(self, resp: requests.Response):
+        """レスポンスのレートヘッダとステータスから次の送信タイミングを補正する"""
+        with self._lock:
+            now = time.time()
+            self._inflight = max(0, self._inflight - 1)
+
+            elapsed = resp.elapsed.total_seconds() if resp.elapsed else 0.0
+            self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+
+            try:
+                limit = int(resp.headers["x-rate-limit-limit"]) if "x-rate-limit-limit" in resp.headers else None
+                remaining = int(resp.headers["x-rate-limit-remaining"]) if "x-rate-limit-remaining" in resp.headers else None
+                reset = float(resp.headers["x-rate-limit-reset"]) if "x-rate-limit-reset" in resp.headers else None
+            except ValueError:
+                limit = remaining = reset = None
+
+            if remaining is not None:
+                if not self._has_headers:
+                    # フォールバック間隔で予約していた分は取り消して、枠ベースに切り替える
+                    self._next_send_at = min(self._next_send_at, now + self.min_interval)
+                self._has_headers = True
+                # 応答待ちの分は、まだサーバー側の残り枠に反映されていない
+                self._remaining = max(0, remaining - self._inflight)
+                if limit is not None:
+                    self._limit = limit
+                elif self._limit < remaining:
+                    self._limit = remaining
+                if reset is not None:
+                    self._reset_at = reset
+
+            if resp.status_code in (429, 503):
+                if resp.status_code == 429 and remaining == 0 and reset is not None and reset > now:
+                    # 窓の枠を使い切った → reset まで待つ
+                    self._next_send_at = max(self._next_send_at, reset + 1)
+                else:
+                    # 枠は残っている・reset が分からない（一時的な過負荷）→ ジッター付き指数バックオフ
+                    self._backoff = min(self.max_backoff, max(self.fallback_interval, self._backoff * 2))
+                    delay = self._backoff * random.uniform(0.8, 1.2)
+                    self._next_send_at = max(self._next_send_at, now + delay)
+            else:
+                self._backoff = 0.0
+
+    def headroom(self) -> Dict[str, float]:
+        """/metrics 用の現在の枠（ヘッダを受け取るまでは limit / remaining は 0）"""
+        with self._lock:
+            now = time.time()
+            self._refill_locked(now)
+            return {
+                "limit": self._limit,
+                "remaining": self._remaining,
+                "reset_seconds": max(0.0, self._reset_at - now) if self._has_headers else 0.0,
+                "next_send_seconds": max(0.0, self._next_send_at - now),
+                "inflight": self._inflight,
+                "latency_seconds": self._latency or 0.0,
+            }
+
+    # ---- 見積もり ----
+    def eta_seconds(self, items_left: int, concurrency: int = 1) -> int:
+        """残り items_left 件を送り切るまでの見込み秒数（現在の枠・reset・応答時間から算出）"""
+        if items_left <= 0:
+            return 0
+        with self._lock:
+            now = time.time()
+            self._refill_locked(now)
+            latency = self._latency or 0.0
+            start_wait = max(0.0, self._next_send_at - now)
+            per_item = latency / max(1, concurrency)
+
+            if not self._has_headers or self._limit <= 0:
+                return int(start_wait + items_left * max(self.fallback_interval, per_item))
+
+            remaining = self._remaining
+            if items_left <= remaining:
+                return int(start_wait + items_left * max(self.min_interval, per_item))
+
+            # 今の窓の残りを使い切ったあと、reset ごとに limit 件ずつ
+            over = items_left - remaining
+            windows = math.ceil(over / self._limit)
+            until_reset = max(0.0, self._reset_at - now)
+            tail = (over - (windows - 1) * self._limit) * max(self.min_interval, per_item)
+            return int(max(start_wait, until_reset) + (windows - 1) * self.window_sec + tail)
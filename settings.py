@@ -0,0 +1,24 @@
+"""
+画面（app.py）・worker・CLI で共有する設定。
+画面のプロセスも読み込むので、ここでは重いモジュール（削除エンジン・索引・DB）を読み込まない。
+"""
+import os
+
+# データの置き場所（ベンチマークでは環境変数で一時ディレクトリに向ける）
+HOME_DIR = os.environ.get("TWEET_TOOLS_HOME") or os.path.dirname(__file__)
+LOG_DIR = os.path.join(HOME_DIR, "logs")
+os.makedirs(LOG_DIR, exist_ok=True)
+DATA_DIR = os.path.join(HOME_DIR, "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# レート関連（x-rate-limit-* ヘッダに合わせて自動調整）
+INTERVAL_SEC = 20  # ヘッダが返ってこない場合のフォールバック間隔（1件ごと20秒）
+
+# 並列ワーカー（同時に応答待ちにできる削除リクエスト数）
+DEFAULT_WORKERS = 1
+MAX_WORKERS = 8
+
+# 削除ジョブを動かす常駐プロセス（worker.py）の接続先と認証キー
+WORKER_HOST = os.environ.get("TWEET_TOOLS_WORKER_HOST", "127.0.0.1")
+WORKER_PORT = int(os.environ.get("TWEET_TOOLS_WORKER_PORT", "5050"))
+WORKER_KEY_PATH = os.path.join(DATA_DIR, "worker.key")
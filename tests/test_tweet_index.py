@@ -0,0 +1,36 @@
+import pytest
+
+from tweet_index import TweetIndex, parse_filters
+
+
+@pytest.mark.parametrize("key", ["max_likes", "max_rts"])
+def test_parse_filters_keeps_zero(key):
+    # 0 は「いいね（RT）が1件でもあるものは消さない」という指定なので、未指定扱いにしない
+    assert parse_filters({key: 0})[key] == 0
+    assert parse_filters({key: "0"})[key] == 0
+
+
+@pytest.mark.parametrize("value", [None, "", "  "])
+def test_parse_filters_skips_empty(value):
+    assert "max_likes" not in parse_filters({"max_likes": value})
+
+
+def test_parse_filters_rejects_non_number():
+    with pytest.raises(ValueError):
+        parse_filters({"max_rts": "abc"})
+
+
+def test_save_load_round_trip(tmp_path):
+    index = TweetIndex()
+    for tid, text in ((1, "a"), (2, "改行\nあり"), (3, "孤立サロゲート\ud800")):
+        index.ids.append(tid)
+        index.created.append(tid * 10)
+        index.flags.append(tid % 2)
+        index.likes.append(tid)
+        index.rts.append(0)
+        index.texts.append(text)
+    path = str(tmp_path / "index.idx")
+    index.save(path)
+    loaded = TweetIndex.load(path)
+    for name in ("ids", "created", "flags", "likes", "rts", "texts"):
+        assert getattr(loaded, name) == getattr(index, name)
@@ -0,0 +1,228 @@
+import codecs
+import heapq
+import io
+import json
+import os
+import re
+import zipfile
+from datetime import datetime, timezone, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import email.utils as eut  # for RFC 2822 'created_at' parsing
+
+# タイムゾーン（JST固定）
+JST = timezone(timedelta(hours=9))
+
+CHUNK_SIZE = 64 * 1024  # ストリーム読み込みの1回あたりのバイト数
+
+Source = Union[bytes, bytearray, memoryview, str, "os.PathLike[str]", BinaryIO]
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+# アーカイブZIP内のツイート本体（data/tweets.js, data/tweets-part1.js, 旧形式の data/tweet.js など）
+_TWEET_PART_NAME = re.compile(r"(?:^|/)tweets?(?:-part(\d+))?\.js$")
+_ZIP_MAGIC = b"PK\x03\x04"
+
+# Snowflake ID（2010-11-04 以降のツイートID）は上位ビットが投稿時刻（ミリ秒）なので、created_at を読まずに済む
+TWEPOCH_MS = 1288834974657
+FIRST_SNOWFLAKE_ID = 29700859247  # これより小さいIDは連番時代（投稿時刻は created_at から読む）
+
+
+def snowflake_epoch(tid: int) -> Optional[int]:
+    """Snowflake ID から投稿時刻（UNIX秒）を求める。Snowflake より前のIDなら None"""
+    if tid < FIRST_SNOWFLAKE_ID:
+        return None
+    return ((tid >> 22) + TWEPOCH_MS) // 1000
+
+
+def parse_twitter_created_at_to_jst(s: str) -> Optional[str]:
+    """
+    Twitterの created_at (例: 'Mon Apr 06 22:19:45 +0000 2009') を
+    JST(+09:00) の ISO 文字列に変換する。失敗したら None。
+    """
+    try:
+        dt = eut.parsedate_to_datetime(s)   # tz-aware
+        return dt.astimezone(JST).isoformat(timespec="seconds")
+    except Exception:
+        return None
+
+
+def _open_source(source: Source) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    return source
+
+
+def iter_tweet_js(source: Source, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    tweet.js（window.YTD.tweets.partN = [...]）の配列要素を1件ずつ返す。
+    source はバイト列・ファイルパス・バイナリファイルオブジェクト（アップロードのストリーム等）。
+    チャンク単位で読みながらデコードするので、使うメモリはアーカイブの大きさに依存しない。
+    """
+    fp = _open_source(source)
+    should_close = fp is not source
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = fp.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + decoder.decode(chunk, final=eof)
+        pos = 0
+        return True
+
+    try:
+        # 先頭の "window.YTD.tweets.part0 = " などを読み飛ばして '[' を探す
+        while True:
+            i = buf.find("[", pos)
+            if i >= 0:
+                pos = i + 1
+                break
+            pos = len(buf)
+            if not fill():
+                raise ValueError("配列 '[' が見つからないよ")
+
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos >= len(buf):
+                if not fill():
+                    raise ValueError("配列が ']' で閉じられていないよ")
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = parser.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 要素の途中でチャンクが切れている → 続きを読んでやり直す
+                if not fill():
+                    raise
+                continue
+            if end >= len(buf) and not eof:
+                # 数値などが途中で切れている可能性があるので、続きを読んでから確定させる
+                fill()
+                continue
+            pos = end
+            yield obj
+    finally:
+        if should_close:
+            fp.close()
+
+
+def tweet_record(tw: Dict[str, Any]) -> Optional[Dict[str, Optional[str]]]:
+    """アーカイブの "tweet" オブジェクトを {"id","text","posted_at"} にする（IDが無ければ None）"""
+    tid = tw.get("id_str") or tw.get("id")
+    if not tid:
+        return None
+    ttext = tw.get("full_text") or tw.get("text") or ""
+    created = snowflake_epoch(int(tid))
+    if created is not None:
+        posted_at_iso = datetime.fromtimestamp(created, JST).isoformat(timespec="seconds")
+    else:
+        posted_at_iso = parse_twitter_created_at_to_jst(tw.get("created_at", ""))
+    return {"id": str(tid), "text": ttext, "posted_at": posted_at_iso}
+
+
+def iter_tweets(source: Source, record: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = tweet_record
+                ) -> Iterator[Dict[str, Any]]:
+    """
+    tweet.js から record() の結果（既定は {"id":"...", "text":"...", "posted_at":"..."}）を1件ずつ（ファイル順に）返す。
+    """
+    for item in iter_tweet_js(source):
+        if isinstance(item, dict) and "tweet" in item:
+            rec = record(item["tweet"])
+            if rec is not None:
+                yield rec
+
+
+def _is_zip(fp: BinaryIO) -> bool:
+    if not fp.seekable():
+        return False
+    pos = fp.tell()
+    head = fp.read(len(_ZIP_MAGIC))
+    fp.seek(pos)
+    return head == _ZIP_MAGIC
+
+
+def iter_tweet_parts(source: Source) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    tweet.js 単体ならそれ自体を、アーカイブZIPなら中の tweets*.js を part 番号順に
+    (名前, バイナリストリーム) で返す。ZIPは展開せず、メンバーをその場でストリーム読みする。
+    """
+    fp = _open_source(source)
+    should_close = fp is not source
+    try:
+        if not _is_zip(fp):
+            yield getattr(fp, "name", "tweet.js"), fp
+            return
+        with zipfile.ZipFile(fp) as zf:
+            parts = []
+            for info in zf.infolist():
+                m = _TWEET_PART_NAME.search(info.filename)
+                if m and not info.is_dir():
+                    parts.append((int(m.group(1) or 0), info.filename))
+            for _, name in sorted(parts):
+                with zf.open(name) as member:
+                    yield name, member
+    finally:
+        if should_close:
+            fp.close()
+
+
+def _ascending_part(fp: BinaryIO, record: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+                    ) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    1パート分を (int(id), record) のID昇順リストにする（record の "id" が int ならそのまま使う）。
+    アーカイブの各パートは新しい順に並んでいるのが普通なので、その場合は反転だけで済ませる。
+    """
+    part = [(rec["id"] if type(rec["id"]) is int else int(rec["id"]), rec) for rec in iter_tweets(fp, record)]
+    ids = [tid for tid, _ in part]
+    if all(a <= b for a, b in zip(ids, ids[1:])):
+        return part
+    if all(a >= b for a, b in zip(ids, ids[1:])):
+        part.reverse()
+        return part
+    part.sort(key=lambda x: x[0])
+    return part
+
+
+def iter_tweet_archive(sources: Iterable[Source],
+                       record: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = tweet_record
+                       ) -> Iterator[Dict[str, Any]]:
+    """
+    複数の tweet.js / tweets-partN.js / アーカイブZIP をまとめて、ID昇順（古い順）に1件ずつ返す。
+    パートごとに昇順へ揃えてから k-way マージするので、全体の再ソートはしない。重複IDは1件にまとめる。
+    record には "id" キー（文字列か int）を持つ dict を返す関数を渡せる（既定は tweet_record）。
+    """
+    parts = []
+    for source in sources:
+        for _, fp in iter_tweet_parts(source):
+            parts.append(_ascending_part(fp, record))
+
+    last_id = None
+    for tid, rec in heapq.merge(*parts, key=lambda x: x[0]):
+        if tid == last_id:
+            continue
+        last_id = tid
+        yield rec
+
+
+def parse_tweet_archive(sources: Iterable[Source]) -> List[Dict[str, Optional[str]]]:
+    """iter_tweet_archive() の結果をリストで返す"""
+    return list(iter_tweet_archive(sources))
+
+
+def parse_tweet_js(source: Source) -> List[Dict[str, Optional[str]]]:
+    """
+    tweet.js（window.YTD.tweets.part0 = ...）またはアーカイブZIPから
+    [{"id":"...", "text":"...", "posted_at":"..."}] の配列を返す。
+    削除順は「古い方から」にしたいので、ID昇順に並べて返す（Twitter Snowflakeは時間順）。
+    """
+    return parse_tweet_archive([source])
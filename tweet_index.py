@@ -0,0 +1,201 @@
+import os
+import re
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import email.utils as eut
+
+from tweet_archive import JST, Source, iter_tweet_archive, snowflake_epoch
+from tweet_queue import NO_TIME, TweetQueue, format_posted_at
+
+FLAG_RETWEET = 1
+FLAG_REPLY = 2
+RT_PREFIX = "RT @"    # アーカイブのリツイートは本文がこれで始まる
+
+# retweets / replies の指定
+INCLUDE, EXCLUDE, ONLY = "include", "exclude", "only"
+
+
+def _count(value: Any) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_filters(values: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    フォームやコマンドラインの文字列の絞り込み条件を TweetIndex.select() の形にする（不正な値は ValueError）。
+    キー: since_date / until_date（YYYY-MM-DD、JST）, retweets, replies, max_likes, max_rts, pattern
+    """
+    filters: Dict[str, Any] = {}
+    for key, name in (("since", "since_date"), ("until", "until_date")):
+        value = (values.get(name) or "").strip()
+        if value:
+            try:
+                day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=JST)
+            except ValueError:
+                raise ValueError(f"日付の形式がおかしいよ: {value}")
+            filters[key] = int(day.timestamp())
+    for key in ("retweets", "replies"):
+        mode = values.get(key) or INCLUDE
+        if mode not in (INCLUDE, EXCLUDE, ONLY):
+            raise ValueError(f"{key} の指定がおかしいよ: {mode}")
+        filters[key] = mode
+    for key in ("max_likes", "max_rts"):
+        value = values.get(key)
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value != "":
+            try:
+                filters[key] = max(0, int(value))
+            except ValueError:
+                raise ValueError(f"数値を入れてね: {value}")
+    pattern = values.get("pattern") or ""
+    if pattern:
+        try:
+            filters["pattern"] = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"正規表現のエラー: {e}")
+    return filters
+
+
+def index_record(tw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    アーカイブの "tweet" オブジェクトから、索引に載せる列だけを取り出す（IDが無ければ None）。
+    ID は int にして返す。投稿時刻は ID から求め、created_at を読むのは Snowflake より前のツイートだけ。
+    """
+    tid = tw.get("id_str") or tw.get("id")
+    if not tid:
+        return None
+    tid = int(tid)
+    text = tw.get("full_text") or tw.get("text") or ""
+    created = snowflake_epoch(tid)
+    if created is None:
+        try:
+            created = int(eut.parsedate_to_datetime(tw.get("created_at", "")).timestamp())
+        except Exception:
+            created = NO_TIME
+    flags = 0
+    if text.startswith(RT_PREFIX) or "retweeted_status" in tw:
+        flags |= FLAG_RETWEET
+    if tw.get("in_reply_to_status_id_str") or tw.get("in_reply_to_status_id"):
+        flags |= FLAG_REPLY
+    return {"id": tid, "text": text, "created": created, "flags": flags,
+            "likes": _count(tw.get("favorite_count")), "rts": _count(tw.get("retweet_count"))}
+
+
+class TweetIndex:
+    """
+    アーカイブのツイートを列ごとの配列（ID・投稿時刻・RT/リプライ・いいね数・RT数・本文）に持つ索引。
+    絞り込みは列を順に走査して行番号を減らしていくだけなので、100万件でも再解析なしで数え直せる。
+    行はID昇順（古い順）。
+    """
+
+    def __init__(self):
+        self.ids = array("Q")
+        self.created = array("q")   # UNIX秒（NO_TIME = 不明）
+        self.flags = array("B")
+        self.likes = array("L")
+        self.rts = array("L")
+        self.texts: List[str] = []
+
+    @classmethod
+    def build(cls, sources: Iterable[Source]) -> "TweetIndex":
+        index = cls()
+        for rec in iter_tweet_archive(sources, record=index_record):
+            index.ids.append(rec["id"])
+            index.created.append(rec["created"])
+            index.flags.append(rec["flags"])
+            index.likes.append(min(rec["likes"], 0xFFFFFFFF))
+            index.rts.append(min(rec["rts"], 0xFFFFFFFF))
+            index.texts.append(rec["text"])
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _columns(self) -> List[array]:
+        return [self.ids, self.created, self.flags, self.likes, self.rts]
+
+    def save(self, path: str):
+        """
+        列をそのままファイルに書く（件数・各列・本文のバイト長・本文の順）。
+        同じマシンの別プロセスが load() で読む用なので、配列の型の大きさ・バイト順はそのまま
+        """
+        texts = [t.encode("utf-8", "surrogatepass") for t in self.texts]  # JSON の \ud800 などの孤立サロゲートもそのまま
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            array("Q", [len(self)]).tofile(f)
+            for col in self._columns():
+                col.tofile(f)
+            array("L", map(len, texts)).tofile(f)
+            f.write(b"".join(texts))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TweetIndex":
+        index = cls()
+        with open(path, "rb") as f:
+            n = array("Q")
+            n.fromfile(f, 1)
+            for col in index._columns():
+                col.fromfile(f, n[0])
+            lengths = array("L")
+            lengths.fromfile(f, n[0])
+            blob = f.read()
+        pos = 0
+        for size in lengths:
+            index.texts.append(blob[pos:pos + size].decode("utf-8", "surrogatepass"))
+            pos += size
+        return index
+
+    def select(self, filters: Dict[str, Any]) -> Sequence[int]:
+        """
+        条件に合う行番号（昇順）を返す。filters のキー（どれも省略可）:
+          since / until : 投稿時刻の範囲（UNIX秒、since 以上 until 未満。時刻不明の行は外す）
+          retweets / replies : "include"（既定）/ "exclude" / "only"
+          max_likes / max_rts : いいね数・RT数の上限（以下）
+          pattern : 本文の正規表現（re.Pattern）
+        安い条件から順にかけて、正規表現は最後に残った行にだけ使う。
+        """
+        rows: Sequence[int] = range(len(self))
+        since, until = filters.get("since"), filters.get("until")
+        if since is not None or until is not None:
+            lo = since if since is not None else 0
+            hi = until if until is not None else 2 ** 63 - 1
+            c = self.created
+            rows = [i for i in rows if lo <= c[i] < hi]
+        for key, bit in (("retweets", FLAG_RETWEET), ("replies", FLAG_REPLY)):
+            mode = filters.get(key) or INCLUDE
+            f = self.flags
+            if mode == EXCLUDE:
+                rows = [i for i in rows if not f[i] & bit]
+            elif mode == ONLY:
+                rows = [i for i in rows if f[i] & bit]
+        for key, col in (("max_likes", self.likes), ("max_rts", self.rts)):
+            limit = filters.get(key)
+            if limit is not None:
+                rows = [i for i in rows if col[i] <= limit]
+        pattern: Optional["re.Pattern[str]"] = filters.get("pattern")
+        if pattern is not None:
+            t = self.texts
+            rows = [i for i in rows if pattern.search(t[i])]
+        return rows
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        return len(self.select(filters))
+
+    def records(self, rows: Iterable[int]) -> Iterator[Dict[str, Optional[str]]]:
+        """行を {"id","text","posted_at"} にして返す"""
+        for i in rows:
+            yield {"id": str(self.ids[i]), "text": self.texts[i], "posted_at": format_posted_at(self.created[i])}
+
+    def queue(self, rows: Iterable[int]) -> TweetQueue:
+        """行を削除キューにする（行ごとの dict は作らない）"""
+        q = TweetQueue()
+        for i in rows:
+            q.append(self.ids[i], self.texts[i], self.created[i])
+        return q
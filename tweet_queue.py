@@ -0,0 +1,101 @@
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from tweet_archive import JST, snowflake_epoch
+
+NO_TIME = -1  # 投稿時刻が不明
+
+
+def format_posted_at(created: int) -> Optional[str]:
+    """UNIX秒を JST の ISO 文字列にする（ログの posted_at 列の形）"""
+    if created == NO_TIME:
+        return None
+    return datetime.fromtimestamp(created, JST).isoformat(timespec="seconds")
+
+
+def parse_posted_at(value: Optional[str]) -> int:
+    """format_posted_at() の逆。読めなければ NO_TIME"""
+    if not value:
+        return NO_TIME
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return NO_TIME
+
+
+def stored_posted_at(tid: int, created: int) -> Optional[str]:
+    """
+    job_store に残す投稿時刻。Snowflake ID なら ID から求め直せるので None（ジョブ作成時に全件を ISO 整形しない）。
+    restore_created() で元に戻す。
+    """
+    if created == NO_TIME or snowflake_epoch(tid) == created:
+        return None
+    return format_posted_at(created)
+
+
+def restore_created(tid: int, posted_at: Optional[str]) -> int:
+    """stored_posted_at() の逆"""
+    if posted_at:
+        return parse_posted_at(posted_at)
+    created = snowflake_epoch(tid)
+    return NO_TIME if created is None else created
+
+
+class TweetQueue:
+    """
+    削除キュー。ID・seq・投稿時刻は64bit整数の配列、本文は UTF-8 で1本のバッファに連結して
+    区切り位置だけを持つ。{"seq","id","text","created"} の dict は取り出すときに1件ずつ作る
+    （処理中の1件とログ1行の分だけ）ので、100万件でも dict 100万個ぶんのメモリを使わない。
+    投稿時刻は UNIX秒のまま持ち、ISO 文字列にするのはログに書くときだけ。
+    """
+
+    __slots__ = ("ids", "seqs", "created", "_text", "_offsets")
+
+    def __init__(self):
+        self.ids = array("Q")
+        self.seqs = array("q")
+        self.created = array("q")
+        self._text = bytearray()
+        self._offsets = array("Q", [0])  # i 件目の本文は _text[_offsets[i]:_offsets[i + 1]]
+
+    def append(self, tid: Any, text: Optional[str] = "", created: int = NO_TIME, seq: Optional[int] = None):
+        """seq を省略するとキュー内の位置を使う"""
+        self.seqs.append(len(self.ids) if seq is None else seq)
+        self.ids.append(int(tid))
+        self.created.append(created)
+        self._text += (text or "").encode("utf-8")
+        self._offsets.append(len(self._text))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def text_at(self, i: int) -> str:
+        return self._text[self._offsets[i]:self._offsets[i + 1]].decode("utf-8", errors="replace")
+
+    def posted_at(self, i: int) -> Optional[str]:
+        return format_posted_at(self.created[i])
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return {"seq": self.seqs[i], "id": str(self.ids[i]), "text": self.text_at(i), "created": self.created[i]}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def columns(self) -> Iterator[Tuple[int, str, int]]:
+        """(ID, 本文, 投稿時刻) を dict を作らずに順に返す"""
+        ids, created = self.ids, self.created
+        for i in range(len(ids)):
+            yield ids[i], self.text_at(i), created[i]
+
+    def select(self, positions: Iterable[int]) -> "TweetQueue":
+        """positions の位置だけを（seq はそのまま）抜き出した新しいキュー"""
+        out = TweetQueue()
+        for i in positions:
+            out.seqs.append(self.seqs[i])
+            out.ids.append(self.ids[i])
+            out.created.append(self.created[i])
+            out._text += self._text[self._offsets[i]:self._offsets[i + 1]]
+            out._offsets.append(len(out._text))
+        return out
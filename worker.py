@@ -0,0 +1,198 @@
+"""
+削除ジョブを動かす常駐プロセス（Flask は読み込まない）。
+
+画面（app.py）はジョブを自分では動かさず、ローカルの IPC（multiprocessing.connection、認証キー付き）で
+このプロセスに「開始・再開・一時停止・状態の取得」を頼むだけにする（画面側は worker_client.WorkerClient を使う）。
+そのため画面は gunicorn などの WSGI サーバーで複数プロセスにしても、再起動しても、ジョブが二重に走ったり消えたりしない。
+進捗DB・削除済みIDの索引・ログの索引・ジョブ管理は serve() で作り、このプロセスだけが持つ。
+
+使い方（リポジトリ直下で）:
+    python worker.py                                  # 先に起動しておく
+    gunicorn -w 4 -k gthread --threads 8 app:app      # 画面（python app.py で起動したときは worker も自動で起動する）
+
+接続先は TWEET_TOOLS_WORKER_HOST / TWEET_TOOLS_WORKER_PORT（既定 127.0.0.1:5050）。
+認証キーは TWEET_TOOLS_WORKER_KEY か、初回起動時に data/worker.key に作るもの（画面側も同じファイルを読む）。
+"""
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from api_client import credential_key
+from deleter import JobManager, build_status, idle_state, make_client, open_engine, submit_job, verify_credentials
+from job_store import JobStore
+from log_index import LogIndex
+from settings import LOG_DIR, WORKER_HOST, WORKER_PORT
+from tweet_queue import TweetQueue
+from worker_client import load_authkey
+
+# ====== 基本設定 ======
+STOP_TIMEOUT_SEC = 60.0   # 終了時、実行中のジョブが応答待ちを処理し終えるまで待つ秒数
+
+# serve() で作る。ログに書くのは worker なので、ログの検索・集計用の索引も worker だけが持つ
+job_store: Optional[JobStore] = None
+jobs: Optional[JobManager] = None
+log_index: Optional[LogIndex] = None
+
+
+# ====== worker 側 ======
+def _client_for(keys: Sequence[str]):
+    return make_client(*keys)
+
+
+def _account_key(keys: Sequence[str]) -> str:
+    return credential_key(("oauth1", keys[0], keys[2]))
+
+
+def handle_verify(keys: Sequence[str]) -> Tuple[bool, int, str, dict]:
+    return verify_credentials(_client_for(keys))
+
+
+def handle_submit(keys: Sequence[str], tweets: TweetQueue, workers: int, preflight: bool) -> Dict[str, Any]:
+    job, resumed, skipped = submit_job(_client_for(keys), _account_key(keys), tweets, workers, preflight)
+    return {"job_id": job.job_id if job else None, "resumed": resumed, "skipped": skipped}
+
+
+def handle_resume(keys: Sequence[str], workers: int, preflight: bool) -> Optional[str]:
+    account_key = _account_key(keys)
+    found = job_store.find_resumable(account_key)
+    if not found:
+        return None
+    return jobs.start(_client_for(keys), account_key, found["job_id"], workers, preflight).job_id
+
+
+def handle_control(job_id: Optional[str], cmd: str) -> bool:
+    job = jobs.get(job_id)
+    if job is None:
+        return False
+    job.control(cmd)
+    return True
+
+
+def handle_status(job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    job = jobs.get(job_id)
+    if job is not None:
+        return job.status()
+    if job_id is None:
+        return build_status(idle_state())
+    return None
+
+
+def handle_status_json(job_id: Optional[str]) -> Optional[str]:
+    job = jobs.get(job_id)
+    return job.status_json() if job is not None else None
+
+
+def handle_jobs() -> List[Dict[str, Any]]:
+    return [j.status() for j in jobs.list()]
+
+
+def handle_snapshots() -> List[Dict[str, Any]]:
+    return [dict(j.snapshot()) for j in jobs.list()]
+
+
+def handle_log_search(tid: int) -> List[Dict[str, Any]]:
+    log_index.refresh()  # 実行中のジョブが追記した分を取り込んでから
+    return log_index.search(tid)
+
+
+def handle_log_summary() -> Dict[str, Any]:
+    log_index.refresh()
+    return log_index.summary()
+
+
+def handle_wait_change(seen: int, timeout: float) -> int:
+    return jobs.wait_change(seen, timeout)
+
+
+HANDLERS: Dict[str, Callable[..., Any]] = {
+    "ping": lambda: os.getpid(),
+    "verify": handle_verify,
+    "submit": handle_submit,
+    "resume": handle_resume,
+    "control": handle_control,
+    "status": handle_status,
+    "status_json": handle_status_json,
+    "jobs": handle_jobs,
+    "snapshots": handle_snapshots,
+    "log_search": handle_log_search,
+    "log_summary": handle_log_summary,
+    "wait_change": handle_wait_change,
+    "metrics": metrics.render,
+}
+
+
+def _serve_connection(conn: Connection):
+    # 1接続につき1スレッド。画面側はスレッドごとに接続を使い回すので、要求は順番に届く
+    with conn:
+        while True:
+            try:
+                method, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            handler = HANDLERS.get(method)
+            try:
+                if handler is None:
+                    raise ValueError(f"unknown method: {method}")
+                reply = ("ok", handler(**kwargs))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+
+def stop_jobs(timeout: float = STOP_TIMEOUT_SEC):
+    """実行中のジョブをキャンセルし、応答待ちを処理し終えるまで待つ（続きは再開できる）"""
+    running = [j for j in jobs.list() if j.running]
+    for job in running:
+        job.control("cancel")
+    deadline = time.time() + timeout
+    seen = -1
+    while any(j.running for j in running) and time.time() < deadline:
+        seen = jobs.wait_change(seen, max(0.0, deadline - time.time()))
+
+
+def serve(host: str = WORKER_HOST, port: int = WORKER_PORT):
+    global job_store, jobs, log_index
+    listener = Listener((host, port), authkey=load_authkey(create=True))
+    job_store, jobs = open_engine()
+    log_index = LogIndex(LOG_DIR)
+    job_store.mark_interrupted()
+    # 初回は全ログを読むので、検索・集計を待たせないよう先に取り込んでおく
+    threading.Thread(target=log_index.refresh, daemon=True).start()
+    print(f"worker: {host}:{port} (pid {os.getpid()})", flush=True)
+    try:
+        with listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    # 認証キー違いの接続など。待ち受けは続ける
+                    print(f"worker: 接続を拒否したよ: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+                    continue
+                threading.Thread(target=_serve_connection, args=(conn,), daemon=True).start()
+    finally:
+        stop_jobs()
+
+
+def _on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _on_sigterm)  # Ctrl+C と同じく、実行中のジョブを区切りよく止めてから終わる
+    try:
+        serve()
+    except OSError as e:
+        # 同じポートで別の worker が動いている、など
+        print(f"worker: {WORKER_HOST}:{WORKER_PORT} で待ち受けできなかったよ: {e}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
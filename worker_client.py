@@ -0,0 +1,107 @@
+"""
+削除ジョブを動かす常駐プロセス（worker.py）に要求を送る側。
+画面（app.py）のプロセスが読み込むので、削除エンジン・索引・DB は読み込まない（設定は settings.py から）。
+"""
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict
+
+from settings import WORKER_HOST, WORKER_KEY_PATH, WORKER_PORT
+
+START_TIMEOUT_SEC = 10.0  # 自動起動したとき、接続できるようになるまで待つ秒数
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+class WorkerUnavailable(Exception):
+    """worker に接続できない（起動していない・認証キーが違う）"""
+
+
+class WorkerError(Exception):
+    """worker 側で要求の処理に失敗した"""
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """接続の認証キー（TWEET_TOOLS_WORKER_KEY か data/worker.key。create なら無いときに作る）"""
+    env = os.environ.get("TWEET_TOOLS_WORKER_KEY")
+    if env:
+        return env.encode("utf-8")
+    try:
+        with open(WORKER_KEY_PATH, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            raise WorkerUnavailable("worker の認証キーが無いよ（python worker.py を先に起動してね）")
+    key = secrets.token_hex(32).encode("ascii")
+    fd = os.open(WORKER_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+class WorkerClient:
+    """
+    worker に要求を送る。接続はスレッドごとに1本持って使い回す（SSE の長い待ちが他の要求を塞がないように）。
+    worker が再起動していたら1回だけつなぎ直す。
+    """
+
+    def __init__(self, host: str = WORKER_HOST, port: int = WORKER_PORT):
+        self.address = (host, port)
+        self._local = threading.local()
+
+    def _connect(self) -> Connection:
+        try:
+            return Client(self.address, authkey=load_authkey())
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise WorkerUnavailable(f"worker（{self.address[0]}:{self.address[1]}）に接続できないよ: {e}") from e
+
+    def call(self, method: str, **kwargs) -> Any:
+        for retry in (False, True):
+            conn = getattr(self._local, "conn", None)
+            fresh = conn is None
+            if fresh:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send((method, kwargs))
+                kind, value = conn.recv()
+            except (EOFError, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                if fresh or retry:
+                    raise WorkerUnavailable(f"worker との接続が切れたよ: {type(e).__name__}") from e
+                continue
+            if kind == "error":
+                raise WorkerError(value)
+            return value
+
+    def available(self) -> bool:
+        try:
+            self.call("ping")
+            return True
+        except WorkerUnavailable:
+            return False
+
+    def ensure_running(self, timeout: float = START_TIMEOUT_SEC) -> bool:
+        """
+        worker が動いていなければ別プロセス（画面を止めても残る）で起動し、接続できるまで待つ。
+        python app.py で動かすとき用。WSGI サーバーでは worker.py を別に起動しておく
+        """
+        if self.available():
+            return True
+        kwargs: Dict[str, Any] = {"cwd": os.path.dirname(WORKER_SCRIPT)}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen([sys.executable, WORKER_SCRIPT], **kwargs)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.2)
+            if self.available():
+                return True
+        return False